@@ -1,75 +1,28 @@
 #!/usr/bin/env python3
 import os
 import sys
+import argparse
 from app import app
 from models import db, Role, User
+from seed import ensure_roles
+from sqlalchemy.orm import joinedload
 
-def create_admin_user():
+def create_admin_user(reset_password=False):
     """Create admin user and roles if they don't exist"""
     with app.app_context():
         try:
-            # Check if roles exist
-            admin_role = Role.query.filter_by(name='Admin').first()
-            if not admin_role:
-                print("Creating roles...")
-                
-                # Create roles
-                roles = [
-                    Role(
-                        name="Admin",
-                        description="Full system access with all permissions",
-                        permissions={
-                            "products": ["create", "read", "update", "delete"],
-                            "inventory": ["create", "read", "update", "delete"],
-                            "warehouses": ["create", "read", "update", "delete"],
-                            "suppliers": ["create", "read", "update", "delete"],
-                            "purchase_orders": ["create", "read", "update", "delete"],
-                            "reports": ["read"],
-                            "users": ["create", "read", "update", "delete"],
-                            "system": ["backup", "restore", "settings"]
-                        }
-                    ),
-                    Role(
-                        name="User",
-                        description="Standard user access with limited permissions",
-                        permissions={
-                            "products": ["read"],
-                            "inventory": ["read", "update"],
-                            "warehouses": ["read"],
-                            "suppliers": ["read"],
-                            "purchase_orders": ["create", "read"],
-                            "reports": ["read"]
-                        }
-                    ),
-                    Role(
-                        name="Manager",
-                        description="Manager access with most permissions except user management",
-                        permissions={
-                            "products": ["create", "read", "update", "delete"],
-                            "inventory": ["create", "read", "update", "delete"],
-                            "warehouses": ["create", "read", "update"],
-                            "suppliers": ["create", "read", "update", "delete"],
-                            "purchase_orders": ["create", "read", "update", "delete"],
-                            "reports": ["read"]
-                        }
-                    )
-                ]
-                
-                for role in roles:
-                    db.session.add(role)
-                
-                db.session.commit()
-                print("✅ Roles created successfully!")
-                
-                # Refresh admin_role
-                admin_role = Role.query.filter_by(name='Admin').first()
+            # Create any missing default roles
+            created_roles = ensure_roles(db.session)
+            if created_roles:
+                print(f"✅ Roles created successfully: {', '.join(created_roles)}")
             else:
                 print("✅ Roles already exist")
 
             # Check if admin user exists
-            admin_user = User.query.filter_by(username='admin').first()
+            admin_user = db.session.query(User).filter_by(username='admin').first()
             if not admin_user:
                 print("Creating admin user...")
+                admin_role = db.session.query(Role).filter_by(name='Admin').first()
                 
                 # Create admin user
                 admin_user = User(
@@ -84,20 +37,24 @@ def create_admin_user():
                 
                 db.session.add(admin_user)
                 db.session.commit()
+                db.session.close()
                 
                 print("✅ Admin user created successfully!")
                 print("📧 Email: admin@inventory.com")
                 print("👤 Username: admin")
                 print("🔑 Password: Admin123!")
-            else:
+            elif reset_password:
                 print("✅ Admin user already exists")
-                # Update password in case it was changed
                 admin_user.set_password('Admin123!')
                 db.session.commit()
+                db.session.close()
                 print("🔑 Password reset to: Admin123!")
+            else:
+                print("✅ Admin user already exists; password unchanged (use --reset-password to reset it)")
+                return True
 
             # Verify the user can authenticate
-            test_user = User.query.filter_by(username='admin').first()
+            test_user = db.session.query(User).options(joinedload(User.role)).filter_by(username='admin').first()
             if test_user and test_user.check_password('Admin123!'):
                 print("✅ Admin user authentication verified!")
                 print(f"👤 User ID: {test_user.id}")
@@ -115,8 +72,13 @@ def create_admin_user():
         return True
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Create the default roles and admin user')
+    parser.add_argument('--reset-password', action='store_true',
+                        help='Reset the existing admin password to the default')
+    args = parser.parse_args()
+    
     print("🚀 Creating admin user and roles...")
-    success = create_admin_user()
+    success = create_admin_user(reset_password=args.reset_password)
     if success:
         print("\n🎉 Setup completed successfully!")
         print("\n📝 You can now login with:")
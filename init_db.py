@@ -4,11 +4,14 @@ Run this script to create the database and tables.
 """
 
 import pymysql
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
 from app import app
+from seed import ensure_roles
 from models import db, Role, User, Category, Product, Warehouse, Supplier, Inventory, PurchaseOrder, PurchaseOrderItem, StockMovement
 
 def create_database():
-    """Create the MySQL database if it doesn't exist"""
+    """Create the MySQL database if it doesn't exist and return the open connection"""
     try:
         # Connect to MySQL without specifying database
         connection = pymysql.connect(
@@ -25,20 +28,26 @@ def create_database():
             cursor.execute("CREATE DATABASE IF NOT EXISTS inventory_db CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci")
             print("Database 'inventory_db' created or already exists.")
         
-        connection.close()
+        # Keep the connection open so table creation can reuse it
+        connection.select_db('inventory_db')
         
     except Exception as e:
         print(f"Error creating database: {e}")
-        return False
+        return None
     
-    return True
+    return connection
 
-def create_tables():
-    """Create all tables"""
+def create_tables(connection=None):
+    """Create all tables, reusing the bootstrap connection when one is given"""
     try:
         with app.app_context():
             # Create all tables
-            db.create_all()
+            if connection is not None:
+                engine = create_engine('mysql+pymysql://', creator=lambda: connection, poolclass=StaticPool)
+                db.metadata.create_all(bind=engine)
+                engine.dispose()
+            else:
+                db.create_all()
             print("All tables created successfully.")
             
             # Add some sample data
@@ -54,59 +63,15 @@ def create_sample_data():
     """Create some sample data for testing"""
     try:
         # Check if data already exists
-        if Category.query.first():
+        if db.session.query(Category).first():
             print("Sample data already exists. Skipping...")
             return
         
         # Create default roles
-        roles = [
-            Role(
-                name="Admin",
-                description="Full system access with all permissions",
-                permissions={
-                    "products": ["create", "read", "update", "delete"],
-                    "inventory": ["create", "read", "update", "delete"],
-                    "warehouses": ["create", "read", "update", "delete"],
-                    "suppliers": ["create", "read", "update", "delete"],
-                    "purchase_orders": ["create", "read", "update", "delete"],
-                    "reports": ["read"],
-                    "users": ["create", "read", "update", "delete"],
-                    "system": ["backup", "restore", "settings"]
-                }
-            ),
-            Role(
-                name="User",
-                description="Standard user access with limited permissions",
-                permissions={
-                    "products": ["read"],
-                    "inventory": ["read", "update"],
-                    "warehouses": ["read"],
-                    "suppliers": ["read"],
-                    "purchase_orders": ["create", "read"],
-                    "reports": ["read"]
-                }
-            ),
-            Role(
-                name="Manager",
-                description="Manager access with most permissions except user management",
-                permissions={
-                    "products": ["create", "read", "update", "delete"],
-                    "inventory": ["create", "read", "update", "delete"],
-                    "warehouses": ["create", "read", "update"],
-                    "suppliers": ["create", "read", "update", "delete"],
-                    "purchase_orders": ["create", "read", "update", "delete"],
-                    "reports": ["read"]
-                }
-            )
-        ]
-        
-        for role in roles:
-            db.session.add(role)
-        
-        db.session.commit()
+        ensure_roles(db.session)
         
         # Create default admin user
-        admin_role = Role.query.filter_by(name='Admin').first()
+        admin_role = db.session.query(Role).filter_by(name='Admin').first()
         admin_user = User(
             username='admin',
             email='admin@inventory.com',
@@ -118,6 +83,7 @@ def create_sample_data():
         
         db.session.add(admin_user)
         db.session.commit()
+        db.session.close()
         
         # Create sample categories
         categories = [
@@ -127,8 +93,7 @@ def create_sample_data():
             Category(name="Home & Garden", description="Home improvement and gardening supplies")
         ]
         
-        for category in categories:
-            db.session.add(category)
+        db.session.bulk_save_objects(categories)
         
         # Create sample warehouses
         warehouses = [
@@ -146,8 +111,7 @@ def create_sample_data():
             )
         ]
         
-        for warehouse in warehouses:
-            db.session.add(warehouse)
+        db.session.bulk_save_objects(warehouses)
         
         # Create sample suppliers
         suppliers = [
@@ -167,10 +131,10 @@ def create_sample_data():
             )
         ]
         
-        for supplier in suppliers:
-            db.session.add(supplier)
+        db.session.bulk_save_objects(suppliers)
         
         db.session.commit()
+        db.session.close()
         
         # Create sample products
         products = [
@@ -200,10 +164,10 @@ def create_sample_data():
             )
         ]
         
-        for product in products:
-            db.session.add(product)
+        db.session.bulk_save_objects(products)
         
         db.session.commit()
+        db.session.close()
         
         # Create sample inventory
         inventory_items = [
@@ -215,10 +179,10 @@ def create_sample_data():
             Inventory(product_id=3, warehouse_id=2, quantity=75, reorder_level=25, max_stock_level=300)
         ]
         
-        for item in inventory_items:
-            db.session.add(item)
+        db.session.bulk_save_objects(inventory_items)
         
         db.session.commit()
+        db.session.close()
         print("Sample data created successfully.")
         
     except Exception as e:
@@ -229,14 +193,15 @@ if __name__ == "__main__":
     print("Initializing database...")
     
     # Create database
-    if create_database():
+    connection = create_database()
+    if connection:
         print("Database created successfully.")
     else:
         print("Failed to create database. Exiting.")
         exit(1)
     
     # Create tables and sample data
-    if create_tables():
+    if create_tables(connection):
         print("Tables created successfully.")
         print("Database initialization complete!")
     else:
@@ -0,0 +1,46 @@
+"""
+orjson-backed JSON provider for Flask responses.
+"""
+
+from decimal import Decimal
+from flask.json.provider import JSONProvider
+import orjson
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS  # Stringify int dict keys like the stdlib encoder
+
+def _default(obj):
+    """Serialize types orjson doesn't handle natively"""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if hasattr(obj, '__html__'):
+        return str(obj.__html__())
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def _dumps(obj):
+    return orjson.dumps(obj, default=_default, option=ORJSON_OPTIONS)
+
+def stream_json_rows(result, convert_row, **fields):
+    """Yield a {"success": true, "data": [...], "count": n} document one batch of result rows at a time"""
+    yield b'{"success":true,"data":['
+    
+    count = 0
+    for partition in result.partitions():
+        chunk = b','.join(_dumps(convert_row(row)) for row in partition)
+        yield (b',' + chunk) if count else chunk
+        count += len(partition)
+    
+    # Close the array and append the trailing fields to the same object
+    yield b'],' + _dumps({**fields, 'count': count})[1:]
+
+class OrjsonProvider(JSONProvider):
+    """JSON provider that encodes with orjson instead of the stdlib json module"""
+
+    def dumps(self, obj, **kwargs):
+        return _dumps(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(_dumps(obj), mimetype='application/json')
@@ -1,11 +1,42 @@
-from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import func, DECIMAL
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import func, select, DECIMAL
+from sqlalchemy.orm import column_property, configure_mappers
+from werkzeug.security import check_password_hash
+import bcrypt
+import sys
 
 # Create db instance that will be initialized in app.py
 db = SQLAlchemy()
 
+# bcrypt work factor (2^10 rounds is OWASP's minimum recommendation)
+BCRYPT_ROUNDS = 10
+
+def run_blocking(fn, *args):
+    """Run a CPU-bound call on a native thread when eventlet serves requests, so other greenlets keep running"""
+    if 'eventlet' in sys.modules:
+        from eventlet import patcher, tpool
+        if patcher.is_monkey_patched('thread'):
+            return tpool.execute(fn, *args)
+    return fn(*args)
+
+def serialize(*column_names):
+    """Class decorator that generates a `_column_dict` method for the given columns.
+    
+    The method source is built once at class creation, so serializing a row is a
+    single dict literal. DateTime values are left as-is for the orjson provider,
+    which writes them as ISO strings natively.
+    """
+    def decorator(cls):
+        fields = [f"'{name}': self.{name}" for name in column_names]
+        
+        source = "def _column_dict(self):\n    return {" + ", ".join(fields) + "}\n"
+        namespace = {}
+        exec(compile(source, f"<{cls.__name__}._column_dict>", 'exec'), namespace)
+        cls._column_dict = namespace['_column_dict']
+        return cls
+    return decorator
+
+@serialize('id', 'name', 'description', 'permissions', 'created_at')
 class Role(db.Model):
     __tablename__ = 'roles'
     
@@ -13,20 +44,18 @@ class Role(db.Model):
     name = db.Column(db.String(50), unique=True, nullable=False)
     description = db.Column(db.Text)
     permissions = db.Column(db.JSON)  # Store permissions as JSON
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, server_default=func.now())
     
     # Relationships
     users = db.relationship('User', backref='role', lazy=True)
     
     def to_dict(self):
-        return {
-            'id': self.id,
-            'name': self.name,
-            'description': self.description,
-            'permissions': self.permissions,
-            'created_at': self.created_at.isoformat() if self.created_at else None
-        }
+        return self._column_dict()
 
+@serialize(
+    'id', 'username', 'email', 'first_name', 'last_name', 'role_id', 'is_active', 'last_login',
+    'created_at'
+)
 class User(db.Model):
     __tablename__ = 'users'
     
@@ -39,53 +68,55 @@ class User(db.Model):
     role_id = db.Column(db.Integer, db.ForeignKey('roles.id'), nullable=False)
     is_active = db.Column(db.Boolean, default=True)
     last_login = db.Column(db.DateTime)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = db.Column(db.DateTime, server_default=func.now())
+    updated_at = db.Column(db.DateTime, server_default=func.now(), onupdate=func.now())
+    
+    # Word search over usernames, emails and names (MySQL only; other backends fall back to LIKE)
+    __table_args__ = (
+        db.Index('ix_users_search_ft', 'username', 'email', 'first_name', 'last_name', mysql_prefix='FULLTEXT').ddl_if(dialect='mysql'),
+    )
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        # bcrypt releases the GIL, so hashing on a native thread doesn't stall the other greenlets
+        self.password_hash = run_blocking(bcrypt.hashpw, password.encode('utf-8'), bcrypt.gensalt(BCRYPT_ROUNDS)).decode('utf-8')
     
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        if self.password_hash.startswith('$2'):
+            return run_blocking(bcrypt.checkpw, password.encode('utf-8'), self.password_hash.encode('utf-8'))
+        
+        # Legacy Werkzeug hash: verify it and upgrade to bcrypt (saved on the caller's next commit)
+        if check_password_hash(self.password_hash, password):
+            self.set_password(password)
+            return True
+        return False
     
     def to_dict(self):
-        return {
-            'id': self.id,
-            'username': self.username,
-            'email': self.email,
-            'first_name': self.first_name,
-            'last_name': self.last_name,
-            'role_id': self.role_id,
-            'role_name': self.role.name if self.role else None,
-            'is_active': self.is_active,
-            'last_login': self.last_login.isoformat() if self.last_login else None,
-            'created_at': self.created_at.isoformat() if self.created_at else None
-        }
+        data = self._column_dict()
+        data['role_name'] = self.role.name if self.role else None
+        return data
 
+@serialize('id', 'name', 'description', 'parent_id', 'created_at', 'updated_at')
 class Category(db.Model):
     __tablename__ = 'categories'
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False, unique=True)
     description = db.Column(db.Text)
-    parent_id = db.Column(db.Integer, db.ForeignKey('categories.id'), nullable=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    parent_id = db.Column(db.Integer, db.ForeignKey('categories.id'), nullable=True, index=True)
+    created_at = db.Column(db.DateTime, server_default=func.now())
+    updated_at = db.Column(db.DateTime, server_default=func.now(), onupdate=func.now())
     
     # Self-referential relationship
     parent = db.relationship('Category', remote_side=[id], backref='children')
     products = db.relationship('Product', backref='category', lazy=True)
     
     def to_dict(self):
-        return {
-            'id': self.id,
-            'name': self.name,
-            'description': self.description,
-            'parent_id': self.parent_id,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
+        return self._column_dict()
 
+@serialize(
+    'id', 'name', 'description', 'sku', 'barcode', 'category_id', 'specifications',
+    'unit_price', 'is_active', 'created_at', 'updated_at'
+)
 class Product(db.Model):
     __tablename__ = 'products'
     
@@ -98,30 +129,27 @@ class Product(db.Model):
     specifications = db.Column(db.JSON)  # Store as JSON for flexibility
     unit_price = db.Column(DECIMAL(10, 2))
     is_active = db.Column(db.Boolean, default=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = db.Column(db.DateTime, server_default=func.now())
+    updated_at = db.Column(db.DateTime, server_default=func.now(), onupdate=func.now())
     
     # Relationships
     inventory_items = db.relationship('Inventory', backref='product', lazy=True, cascade='all, delete-orphan')
     purchase_order_items = db.relationship('PurchaseOrderItem', backref='product', lazy=True)
     stock_movements = db.relationship('StockMovement', backref='product', lazy=True)
     
+    # Word search over name and description (MySQL only; other backends fall back to LIKE)
+    __table_args__ = (
+        db.Index('ix_products_name_description_ft', 'name', 'description', mysql_prefix='FULLTEXT').ddl_if(dialect='mysql'),
+    )
+    
     def to_dict(self):
-        return {
-            'id': self.id,
-            'name': self.name,
-            'description': self.description,
-            'sku': self.sku,
-            'barcode': self.barcode,
-            'category_id': self.category_id,
-            'category_name': self.category.name if self.category else None,
-            'specifications': self.specifications,
-            'unit_price': float(self.unit_price) if self.unit_price else None,
-            'is_active': self.is_active,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
+        data = self._column_dict()
+        data['category_name'] = self.category.name if self.category else None
+        return data
 
+@serialize(
+    'id', 'name', 'location', 'address', 'contact_info', 'is_active', 'created_at', 'updated_at'
+)
 class Warehouse(db.Model):
     __tablename__ = 'warehouses'
     
@@ -131,25 +159,20 @@ class Warehouse(db.Model):
     address = db.Column(db.Text)
     contact_info = db.Column(db.JSON)  # Store phone, email, manager details
     is_active = db.Column(db.Boolean, default=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = db.Column(db.DateTime, server_default=func.now())
+    updated_at = db.Column(db.DateTime, server_default=func.now(), onupdate=func.now())
     
     # Relationships
     inventory_items = db.relationship('Inventory', backref='warehouse', lazy=True)
     stock_movements = db.relationship('StockMovement', backref='warehouse', lazy=True)
     
     def to_dict(self):
-        return {
-            'id': self.id,
-            'name': self.name,
-            'location': self.location,
-            'address': self.address,
-            'contact_info': self.contact_info,
-            'is_active': self.is_active,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
+        return self._column_dict()
 
+@serialize(
+    'id', 'name', 'contact_person', 'email', 'phone', 'address', 'tax_id', 'payment_terms',
+    'is_active', 'created_at', 'updated_at'
+)
 class Supplier(db.Model):
     __tablename__ = 'suppliers'
     
@@ -162,27 +185,24 @@ class Supplier(db.Model):
     tax_id = db.Column(db.String(50))
     payment_terms = db.Column(db.String(100))
     is_active = db.Column(db.Boolean, default=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = db.Column(db.DateTime, server_default=func.now())
+    updated_at = db.Column(db.DateTime, server_default=func.now(), onupdate=func.now())
     
     # Relationships
     purchase_orders = db.relationship('PurchaseOrder', backref='supplier', lazy=True)
     
+    # Word search over name, contact and email (MySQL only; other backends fall back to LIKE)
+    __table_args__ = (
+        db.Index('ix_suppliers_search_ft', 'name', 'contact_person', 'email', mysql_prefix='FULLTEXT').ddl_if(dialect='mysql'),
+    )
+    
     def to_dict(self):
-        return {
-            'id': self.id,
-            'name': self.name,
-            'contact_person': self.contact_person,
-            'email': self.email,
-            'phone': self.phone,
-            'address': self.address,
-            'tax_id': self.tax_id,
-            'payment_terms': self.payment_terms,
-            'is_active': self.is_active,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
+        return self._column_dict()
 
+@serialize(
+    'id', 'product_id', 'warehouse_id', 'quantity', 'reorder_level', 'max_stock_level',
+    'is_low_stock', 'last_updated'
+)
 class Inventory(db.Model):
     __tablename__ = 'inventory'
     
@@ -192,26 +212,30 @@ class Inventory(db.Model):
     quantity = db.Column(db.Integer, default=0)
     reorder_level = db.Column(db.Integer, default=10)
     max_stock_level = db.Column(db.Integer, default=1000)
-    last_updated = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    last_updated = db.Column(db.DateTime, server_default=func.now(), onupdate=func.now())
+    # Stored generated column so low-stock filters can use an index
+    is_low_stock = db.Column(db.Boolean, db.Computed('quantity <= reorder_level', persisted=True))
     
-    # Unique constraint for product-warehouse combination
-    __table_args__ = (db.UniqueConstraint('product_id', 'warehouse_id', name='uq_product_warehouse'),)
+    # Unique constraint for product-warehouse combination (also serves product_id lookups);
+    # the reverse composite index covers per-warehouse lookups, and the low-stock index
+    # turns "low stock in warehouse W" into a seek (MySQL has no partial indexes)
+    __table_args__ = (
+        db.UniqueConstraint('product_id', 'warehouse_id', name='uq_product_warehouse'),
+        db.Index('ix_inventory_warehouse_product', 'warehouse_id', 'product_id'),
+        db.Index('ix_inventory_low_stock', 'is_low_stock', 'warehouse_id'),
+    )
     
     def to_dict(self):
-        return {
-            'id': self.id,
-            'product_id': self.product_id,
-            'product_name': self.product.name if self.product else None,
-            'product_sku': self.product.sku if self.product else None,
-            'warehouse_id': self.warehouse_id,
-            'warehouse_name': self.warehouse.name if self.warehouse else None,
-            'quantity': self.quantity,
-            'reorder_level': self.reorder_level,
-            'max_stock_level': self.max_stock_level,
-            'is_low_stock': self.quantity <= self.reorder_level,
-            'last_updated': self.last_updated.isoformat() if self.last_updated else None
-        }
+        data = self._column_dict()
+        data['product_name'] = self.product.name if self.product else None
+        data['product_sku'] = self.product.sku if self.product else None
+        data['warehouse_name'] = self.warehouse.name if self.warehouse else None
+        return data
 
+@serialize(
+    'id', 'order_number', 'supplier_id', 'status', 'order_date', 'expected_delivery',
+    'actual_delivery', 'notes', 'created_at', 'updated_at'
+)
 class PurchaseOrder(db.Model):
     __tablename__ = 'purchase_orders'
     
@@ -219,87 +243,91 @@ class PurchaseOrder(db.Model):
     order_number = db.Column(db.String(50), unique=True, nullable=False)
     supplier_id = db.Column(db.Integer, db.ForeignKey('suppliers.id'), nullable=False)
     status = db.Column(db.String(20), default='pending')  # pending, approved, ordered, received, cancelled
-    order_date = db.Column(db.DateTime, default=datetime.utcnow)
+    order_date = db.Column(db.DateTime, server_default=func.now())
     expected_delivery = db.Column(db.DateTime)
     actual_delivery = db.Column(db.DateTime)
     total_amount = db.Column(DECIMAL(10, 2), default=0)
     notes = db.Column(db.Text)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = db.Column(db.DateTime, server_default=func.now())
+    updated_at = db.Column(db.DateTime, server_default=func.now(), onupdate=func.now())
     
     # Relationships
     items = db.relationship('PurchaseOrderItem', backref='purchase_order', lazy=True, cascade='all, delete-orphan')
     
+    # Date-bounded status summaries and newest-first listings (total_amount makes the summary index-only)
+    __table_args__ = (
+        db.Index('ix_purchase_orders_created_status', 'created_at', 'status', 'total_amount'),
+    )
+    
     def to_dict(self):
-        return {
-            'id': self.id,
-            'order_number': self.order_number,
-            'supplier_id': self.supplier_id,
-            'supplier_name': self.supplier.name if self.supplier else None,
-            'status': self.status,
-            'order_date': self.order_date.isoformat() if self.order_date else None,
-            'expected_delivery': self.expected_delivery.isoformat() if self.expected_delivery else None,
-            'actual_delivery': self.actual_delivery.isoformat() if self.actual_delivery else None,
-            'total_amount': float(self.total_amount) if self.total_amount else 0,
-            'notes': self.notes,
-            'items_count': len(self.items),
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
+        data = self._column_dict()
+        data['supplier_name'] = self.supplier.name if self.supplier else None
+        data['total_amount'] = self.total_amount or 0
+        data['items_count'] = self.items_count
+        return data
 
+@serialize('id', 'purchase_order_id', 'product_id', 'quantity', 'unit_price', 'received_quantity')
 class PurchaseOrderItem(db.Model):
     __tablename__ = 'purchase_order_items'
     
     id = db.Column(db.Integer, primary_key=True)
-    purchase_order_id = db.Column(db.Integer, db.ForeignKey('purchase_orders.id'), nullable=False)
-    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    purchase_order_id = db.Column(db.Integer, db.ForeignKey('purchase_orders.id'), nullable=False, index=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False, index=True)
     quantity = db.Column(db.Integer, nullable=False)
     unit_price = db.Column(DECIMAL(10, 2), nullable=False)
     received_quantity = db.Column(db.Integer, default=0)
     
     def to_dict(self):
-        return {
-            'id': self.id,
-            'purchase_order_id': self.purchase_order_id,
-            'product_id': self.product_id,
-            'product_name': self.product.name if self.product else None,
-            'product_sku': self.product.sku if self.product else None,
-            'quantity': self.quantity,
-            'unit_price': float(self.unit_price),
-            'received_quantity': self.received_quantity,
-            'total_price': float(self.quantity * self.unit_price),
-            'pending_quantity': self.quantity - self.received_quantity
-        }
+        data = self._column_dict()
+        data['product_name'] = self.product.name if self.product else None
+        data['product_sku'] = self.product.sku if self.product else None
+        data['total_price'] = self.quantity * self.unit_price
+        data['pending_quantity'] = self.quantity - self.received_quantity
+        return data
+
+# Count items in SQL alongside each purchase order instead of loading the collection
+PurchaseOrder.items_count = column_property(
+    select(func.count(PurchaseOrderItem.id))
+    .where(PurchaseOrderItem.purchase_order_id == PurchaseOrder.id)
+    .correlate_except(PurchaseOrderItem)
+    .scalar_subquery()
+)
 
+@serialize(
+    'id', 'product_id', 'warehouse_id', 'movement_type', 'quantity', 'reference_type',
+    'reference_id', 'notes', 'created_at'
+)
 class StockMovement(db.Model):
     __tablename__ = 'stock_movements'
     
     id = db.Column(db.Integer, primary_key=True)
     product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
-    warehouse_id = db.Column(db.Integer, db.ForeignKey('warehouses.id'), nullable=False)
+    warehouse_id = db.Column(db.Integer, db.ForeignKey('warehouses.id'), nullable=False, index=True)
     movement_type = db.Column(db.String(20), nullable=False)  # 'in', 'out', 'transfer', 'adjustment'
     quantity = db.Column(db.Integer, nullable=False)
     reference_type = db.Column(db.String(50))  # 'purchase_order', 'sale', 'transfer', 'adjustment'
     reference_id = db.Column(db.Integer)
     notes = db.Column(db.Text)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, server_default=func.now(), index=True)
+    
+    # Per-product history filtered by reference type and date (also serves product_id lookups);
+    # movement type and date ranges for the reports, covering the turnover aggregate
+    __table_args__ = (
+        db.Index('ix_stock_movements_product_reftype_created', 'product_id', 'reference_type', 'created_at'),
+        db.Index('ix_stock_movements_type_created', 'movement_type', 'created_at', 'product_id', 'quantity'),
+    )
     
     def to_dict(self):
-        return {
-            'id': self.id,
-            'product_id': self.product_id,
-            'product_name': self.product.name if self.product else None,
-            'product_sku': self.product.sku if self.product else None,
-            'warehouse_id': self.warehouse_id,
-            'warehouse_name': self.warehouse.name if self.warehouse else None,
-            'movement_type': self.movement_type,
-            'quantity': self.quantity,
-            'reference_type': self.reference_type,
-            'reference_id': self.reference_id,
-            'notes': self.notes,
-            'created_at': self.created_at.isoformat() if self.created_at else None
-        }
+        data = self._column_dict()
+        data['product_name'] = self.product.name if self.product else None
+        data['product_sku'] = self.product.sku if self.product else None
+        data['warehouse_name'] = self.warehouse.name if self.warehouse else None
+        return data
 
+@serialize(
+    'id', 'type', 'title', 'message', 'recipient_email', 'status', 'error_message',
+    'created_at', 'sent_at'
+)
 class NotificationLog(db.Model):
     __tablename__ = 'notification_logs'
     
@@ -307,21 +335,15 @@ class NotificationLog(db.Model):
     type = db.Column(db.String(50), nullable=False)  # 'low_stock', 'order_status', etc.
     title = db.Column(db.String(200), nullable=False)
     message = db.Column(db.Text, nullable=False)
-    recipient_email = db.Column(db.String(120))
+    recipient_email = db.Column(db.Text)  # comma-separated when one email goes to several recipients
     status = db.Column(db.String(20), default='pending')  # pending, sent, failed
     error_message = db.Column(db.Text)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, server_default=func.now())
     sent_at = db.Column(db.DateTime)
     
     def to_dict(self):
-        return {
-            'id': self.id,
-            'type': self.type,
-            'title': self.title,
-            'message': self.message,
-            'recipient_email': self.recipient_email,
-            'status': self.status,
-            'error_message': self.error_message,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'sent_at': self.sent_at.isoformat() if self.sent_at else None
-        } 
\ No newline at end of file
+        return self._column_dict()
+
+# Configure mappers up front so backref attributes (e.g. User.role) can be
+# used in loader options before the first query runs
+configure_mappers()
@@ -1,24 +1,68 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, g
 from flask_jwt_extended import jwt_required, create_access_token, get_jwt_identity, get_jwt
 from models import db, User, Role
+from services.login_tracker import record_login
+from sqlalchemy import select, exists, union_all
+from sqlalchemy.orm import joinedload, contains_eager, load_only
 from datetime import datetime, timedelta
 import re
+import re2
 
 auth_bp = Blueprint('auth', __name__)
 
+# Validation patterns, compiled once at import
+EMAIL_RE = re2.compile(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}')  # RE2 runs in linear time on untrusted input
+UPPER_RE = re.compile(r'[A-Z]')
+LOWER_RE = re.compile(r'[a-z]')
+DIGIT_RE = re.compile(r'\d')
+
+# Cached id of the default 'User' role assigned on registration
+_default_role_id = None
+
+def get_default_role_id():
+    """Return the default role id, looking it up only on first use"""
+    global _default_role_id
+    if _default_role_id is None:
+        _default_role_id = db.session.query(Role.id).filter_by(name='User').scalar()
+    return _default_role_id
+
+def reset_default_role_cache():
+    """Forget the cached default role id (call after roles are modified)"""
+    global _default_role_id
+    _default_role_id = None
+
+# Columns read by User.to_dict(); password_hash is only loaded where it is checked
+PROFILE_COLUMNS = (
+    User.id, User.username, User.email, User.first_name, User.last_name,
+    User.role_id, User.is_active, User.last_login, User.created_at
+)
+
+def get_user_with_role(user_id):
+    """Load a user's profile columns and its role in a single query"""
+    return db.session.execute(
+        select(User)
+        .options(load_only(*PROFILE_COLUMNS), joinedload(User.role))
+        .where(User.id == user_id)
+    ).scalar_one_or_none()
+
+def get_current_user():
+    """Return the authenticated user (with role), loading it at most once per request"""
+    if 'current_user' not in g:
+        g.current_user = get_user_with_role(get_jwt_identity())
+    return g.current_user
+
 def validate_email(email):
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return re.match(pattern, email) is not None
+    return EMAIL_RE.fullmatch(email) is not None
 
 def validate_password(password):
     # At least 8 characters, one uppercase, one lowercase, one digit
     if len(password) < 8:
         return False, "Password must be at least 8 characters long"
-    if not re.search(r'[A-Z]', password):
+    if not UPPER_RE.search(password):
         return False, "Password must contain at least one uppercase letter"
-    if not re.search(r'[a-z]', password):
+    if not LOWER_RE.search(password):
         return False, "Password must contain at least one lowercase letter"
-    if not re.search(r'\d', password):
+    if not DIGIT_RE.search(password):
         return False, "Password must contain at least one digit"
     return True, "Password is valid"
 
@@ -46,16 +90,21 @@ def register():
         if not is_valid:
             return jsonify({'success': False, 'error': message}), 400
         
-        # Check if username or email already exists
-        if User.query.filter_by(username=data['username']).first():
+        # Check if username or email already exists (both EXISTS probes in one round trip)
+        username_taken, email_taken = db.session.execute(select(
+            exists().where(User.username == data['username']),
+            exists().where(User.email == data['email'])
+        )).one()
+        
+        if username_taken:
             return jsonify({'success': False, 'error': 'Username already exists'}), 409
         
-        if User.query.filter_by(email=data['email']).first():
+        if email_taken:
             return jsonify({'success': False, 'error': 'Email already exists'}), 409
         
-        # Get default role (User role, ID 2)
-        default_role = Role.query.filter_by(name='User').first()
-        if not default_role:
+        # Get default role (User role)
+        default_role_id = get_default_role_id()
+        if not default_role_id:
             return jsonify({'success': False, 'error': 'Default role not found'}), 500
         
         # Create new user
@@ -64,7 +113,7 @@ def register():
             email=data['email'],
             first_name=data['first_name'],
             last_name=data['last_name'],
-            role_id=default_role.id
+            role_id=default_role_id
         )
         user.set_password(data['password'])
         
@@ -73,7 +122,7 @@ def register():
         
         # Create access token
         access_token = create_access_token(
-            identity=str(user.id),
+            identity=user.id,
             expires_delta=timedelta(hours=24)
         )
         
@@ -97,10 +146,14 @@ def login():
         if not data or not data.get('username') or not data.get('password'):
             return jsonify({'success': False, 'error': 'Username and password required'}), 400
         
-        # Find user by username or email
-        user = User.query.filter(
-            (User.username == data['username']) | (User.email == data['username'])
-        ).first()
+        # Find user by username or email; UNION ALL lets each side use its unique index
+        lookup = union_all(
+            select(User, Role).join(User.role).where(User.username == data['username']),
+            select(User, Role).join(User.role).where(User.email == data['username'])
+        ).limit(1)
+        user = db.session.execute(
+            select(User).from_statement(lookup).options(contains_eager(User.role))
+        ).scalar()
         
         if not user or not user.check_password(data['password']):
             return jsonify({'success': False, 'error': 'Invalid credentials'}), 401
@@ -108,20 +161,26 @@ def login():
         if not user.is_active:
             return jsonify({'success': False, 'error': 'Account is disabled'}), 401
         
-        # Update last login
-        user.last_login = datetime.utcnow()
-        db.session.commit()
+        # Queue the last login update; it is written in batches off the request path
+        login_at = datetime.utcnow()
+        record_login(user.id, login_at)
+        user_data = user.to_dict()
+        user_data['last_login'] = login_at
+        
+        # Persist a legacy password hash that check_password upgraded
+        if db.session.is_modified(user):
+            db.session.commit()
         
         # Create access token
         access_token = create_access_token(
-            identity=str(user.id),
+            identity=user.id,
             expires_delta=timedelta(hours=24)
         )
         
         return jsonify({
             'success': True,
             'message': 'Login successful',
-            'user': user.to_dict(),
+            'user': user_data,
             'access_token': access_token
         })
         
@@ -146,8 +205,7 @@ def logout():
 def get_profile():
     """Get current user profile"""
     try:
-        current_user_id = int(get_jwt_identity())
-        user = User.query.get(current_user_id)
+        user = get_current_user()
         
         if not user:
             return jsonify({'success': False, 'error': 'User not found'}), 404
@@ -165,8 +223,7 @@ def get_profile():
 def update_profile():
     """Update current user profile"""
     try:
-        current_user_id = int(get_jwt_identity())
-        user = User.query.get(current_user_id)
+        user = get_current_user()
         
         if not user:
             return jsonify({'success': False, 'error': 'User not found'}), 404
@@ -181,7 +238,7 @@ def update_profile():
             if field in data:
                 if field == 'email' and data[field] != user.email:
                     # Check if new email already exists
-                    if User.query.filter_by(email=data[field]).first():
+                    if db.session.scalar(select(exists().where(User.email == data[field]))):
                         return jsonify({'success': False, 'error': 'Email already exists'}), 409
                     if not validate_email(data[field]):
                         return jsonify({'success': False, 'error': 'Invalid email format'}), 400
@@ -205,25 +262,28 @@ def update_profile():
 def change_password():
     """Change user password"""
     try:
-        current_user_id = int(get_jwt_identity())
+        data = request.get_json()
+        if not data or not data.get('current_password') or not data.get('new_password'):
+            return jsonify({'success': False, 'error': 'Current password and new password required'}), 400
+        
+        # Validate new password before spending a hash on the current one
+        is_valid, message = validate_password(data['new_password'])
+        if not is_valid:
+            return jsonify({'success': False, 'error': message}), 400
+        
+        if data['new_password'] == data['current_password']:
+            return jsonify({'success': False, 'error': 'New password must differ from the current password'}), 400
+        
+        current_user_id = get_jwt_identity()
         user = User.query.get(current_user_id)
         
         if not user:
             return jsonify({'success': False, 'error': 'User not found'}), 404
         
-        data = request.get_json()
-        if not data or not data.get('current_password') or not data.get('new_password'):
-            return jsonify({'success': False, 'error': 'Current password and new password required'}), 400
-        
         # Verify current password
         if not user.check_password(data['current_password']):
             return jsonify({'success': False, 'error': 'Current password is incorrect'}), 401
         
-        # Validate new password
-        is_valid, message = validate_password(data['new_password'])
-        if not is_valid:
-            return jsonify({'success': False, 'error': message}), 400
-        
         # Update password
         user.set_password(data['new_password'])
         db.session.commit()
@@ -242,15 +302,17 @@ def change_password():
 def refresh_token():
     """Refresh JWT token"""
     try:
-        current_user_id = int(get_jwt_identity())
-        user = User.query.get(current_user_id)
+        current_user_id = get_jwt_identity()
+        user = db.session.execute(
+            select(User).options(load_only(User.id, User.is_active)).where(User.id == current_user_id)
+        ).scalar_one_or_none()
         
         if not user or not user.is_active:
             return jsonify({'success': False, 'error': 'User not found or inactive'}), 404
         
         # Create new access token
         access_token = create_access_token(
-            identity=str(user.id),
+            identity=user.id,
             expires_delta=timedelta(hours=24)
         )
         
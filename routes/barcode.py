@@ -1,10 +1,56 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, abort
 from flask_jwt_extended import jwt_required
 from models import db, Product, Inventory, StockMovement
-from datetime import datetime
+from services.cache import cache_get, cache_set, cache_delete, invalidate_tags
+from services.inventory_service import inventory_upsert
+from sqlalchemy import select, insert, update, tuple_, bindparam
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, selectinload
+import secrets
 
 barcode_bp = Blueprint('barcode', __name__)
 
+# Seconds a cached lookup may serve stock changes made outside the scan endpoints
+LOOKUP_CACHE_TTL = 30
+
+# Barcodes rarely change, so the barcode -> product id mapping is kept for a day
+PRODUCT_ID_CACHE_TTL = 86400
+
+# Attempts at a random barcode before giving up on a unique-constraint clash
+BARCODE_ATTEMPTS = 5
+
+# Built once at import; the barcode is bound per call so the compiled SQL is reused
+FIND_PRODUCT_BY_BARCODE = select(Product).where(Product.barcode == bindparam('barcode'))
+
+def lookup_cache_key(barcode):
+    return f"bc:{barcode}"
+
+def product_id_cache_key(barcode):
+    return f"bcid:{barcode}"
+
+def wants_compact():
+    """Whether the scanner asked for the minimal ?compact=true response"""
+    return request.args.get('compact', 'false').lower() == 'true'
+
+def compact_scan_result(product, new_quantity):
+    return {'success': True, 'product_id': product.id, 'sku': product.sku, 'new_quantity': new_quantity}
+
+def find_product_by_barcode(barcode, *options):
+    """Find a product by barcode, resolving its id from the cache when possible"""
+    product_id = cache_get(product_id_cache_key(barcode))
+    if product_id is not None:
+        product = db.session.get(Product, product_id, options=options)
+        # Ignore a stale mapping left by a barcode change or product delete
+        if product and product.barcode == str(barcode):
+            return product
+    
+    product = db.session.scalars(
+        FIND_PRODUCT_BY_BARCODE.options(*options), {'barcode': str(barcode)}
+    ).one_or_none()
+    if product:
+        cache_set(product_id_cache_key(barcode), product.id, PRODUCT_ID_CACHE_TTL)
+    return product
+
 @barcode_bp.route('/lookup', methods=['POST'])
 @jwt_required()
 def lookup_product():
@@ -17,8 +63,16 @@ def lookup_product():
         
         barcode = data['barcode']
         
-        # Find product by barcode
-        product = Product.query.filter_by(barcode=barcode).first()
+        cached = cache_get(lookup_cache_key(barcode))
+        if cached is not None:
+            return jsonify(cached)
+        
+        # Find product by barcode along with its category and stock per warehouse
+        product = find_product_by_barcode(
+            barcode,
+            joinedload(Product.category),
+            selectinload(Product.inventory_items).joinedload(Inventory.warehouse)
+        )
         
         if not product:
             return jsonify({
@@ -27,28 +81,28 @@ def lookup_product():
                 'barcode': barcode
             }), 404
         
-        # Get inventory information
-        inventory_items = Inventory.query.filter_by(product_id=product.id).all()
-        
         inventory_data = []
         total_quantity = 0
         
-        for item in inventory_items:
+        for item in product.inventory_items:
             inventory_data.append({
                 'warehouse_id': item.warehouse_id,
                 'warehouse_name': item.warehouse.name,
                 'quantity': item.quantity,
                 'reorder_level': item.reorder_level,
-                'is_low_stock': item.quantity <= item.reorder_level
+                'is_low_stock': item.is_low_stock
             })
             total_quantity += item.quantity
         
-        return jsonify({
+        result = {
             'success': True,
             'product': product.to_dict(),
             'inventory': inventory_data,
             'total_quantity': total_quantity
-        })
+        }
+        cache_set(lookup_cache_key(barcode), result, LOOKUP_CACHE_TTL)
+        
+        return jsonify(result)
         
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -71,31 +125,29 @@ def scan_receive():
         if quantity <= 0:
             return jsonify({'success': False, 'error': 'Quantity must be greater than 0'}), 400
         
+        # Compact responses skip the category and warehouse loads
+        compact = wants_compact()
+        
         # Find product by barcode
-        product = Product.query.filter_by(barcode=barcode).first()
+        product = find_product_by_barcode(barcode, *(() if compact else (joinedload(Product.category),)))
         if not product:
             return jsonify({'success': False, 'error': 'Product not found'}), 404
         
-        # Get or create inventory item
-        inventory_item = Inventory.query.filter_by(
+        # Create the inventory item or add to it in a single statement
+        db.session.execute(inventory_upsert(), {
+            'product_id': product.id,
+            'warehouse_id': warehouse_id,
+            'quantity': quantity,
+            'reorder_level': 10,
+            'max_stock_level': 1000
+        })
+        
+        # Read the row back (still locked by the upsert) with its warehouse
+        inventory_item = Inventory.query.options(*(() if compact else (joinedload(Inventory.warehouse),))).filter_by(
             product_id=product.id,
             warehouse_id=warehouse_id
-        ).first()
-        
-        if not inventory_item:
-            inventory_item = Inventory(
-                product_id=product.id,
-                warehouse_id=warehouse_id,
-                quantity=0,
-                reorder_level=10,
-                max_stock_level=1000
-            )
-            db.session.add(inventory_item)
-        
-        # Update inventory
-        old_quantity = inventory_item.quantity
-        inventory_item.quantity += quantity
-        inventory_item.last_updated = datetime.utcnow()
+        ).one()
+        old_quantity = inventory_item.quantity - quantity
         
         # Record stock movement
         stock_movement = StockMovement(
@@ -108,16 +160,109 @@ def scan_receive():
         )
         
         db.session.add(stock_movement)
+        
+        # Serialize before committing so the response doesn't reload expired rows
+        if compact:
+            result = compact_scan_result(product, inventory_item.quantity)
+        else:
+            result = {
+                'success': True,
+                'message': 'Inventory received successfully',
+                'product': product.to_dict(),
+                'inventory': inventory_item.to_dict(),
+                'old_quantity': old_quantity,
+                'new_quantity': inventory_item.quantity,
+                'received_quantity': quantity
+            }
+        
+        db.session.commit()
+        invalidate_tags('inventory')
+        cache_delete(lookup_cache_key(barcode))
+        
+        return jsonify(result)
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@barcode_bp.route('/scan-receive/batch', methods=['POST'])
+@jwt_required()
+def scan_receive_batch():
+    """Receive inventory for a batch of barcode scans in one transaction"""
+    try:
+        data = request.get_json()
+        
+        if not data or not data.get('scans'):
+            return jsonify({'success': False, 'error': 'A list of scans is required'}), 400
+        
+        scans = data['scans']
+        required_fields = ['barcode', 'warehouse_id', 'quantity']
+        for index, scan in enumerate(scans):
+            if not isinstance(scan, dict) or not all(field in scan for field in required_fields):
+                return jsonify({'success': False, 'error': f'Scan {index + 1}: barcode, warehouse_id, and quantity are required'}), 400
+            if int(scan['quantity']) <= 0:
+                return jsonify({'success': False, 'error': f'Scan {index + 1}: quantity must be greater than 0'}), 400
+        
+        # Resolve every barcode in one query
+        barcodes = {str(scan['barcode']) for scan in scans}
+        products = {
+            barcode: product_id
+            for product_id, barcode in db.session.execute(
+                select(Product.id, Product.barcode).where(Product.barcode.in_(barcodes))
+            )
+        }
+        
+        unknown = sorted(barcodes - products.keys())
+        if unknown:
+            return jsonify({'success': False, 'error': 'Product not found', 'barcodes': unknown}), 404
+        
+        # Sum quantities per inventory row and record one movement per scan
+        totals = {}
+        movements = []
+        for scan in scans:
+            barcode = str(scan['barcode'])
+            key = (products[barcode], scan['warehouse_id'])
+            quantity = int(scan['quantity'])
+            totals[key] = totals.get(key, 0) + quantity
+            movements.append({
+                'product_id': key[0],
+                'warehouse_id': key[1],
+                'movement_type': 'in',
+                'quantity': quantity,
+                'reference_type': 'barcode_scan',
+                'notes': f"Barcode scan receive: {barcode}"
+            })
+        
+        db.session.execute(inventory_upsert(), [
+            {
+                'product_id': product_id,
+                'warehouse_id': warehouse_id,
+                'quantity': quantity,
+                'reorder_level': 10,
+                'max_stock_level': 1000
+            }
+            for (product_id, warehouse_id), quantity in totals.items()
+        ])
+        db.session.execute(insert(StockMovement), movements)
+        
+        # Report the resulting stock levels for the touched rows
+        inventory = [
+            {'product_id': row.product_id, 'warehouse_id': row.warehouse_id, 'quantity': row.quantity}
+            for row in db.session.execute(
+                select(Inventory.product_id, Inventory.warehouse_id, Inventory.quantity)
+                .where(tuple_(Inventory.product_id, Inventory.warehouse_id).in_(list(totals)))
+            )
+        ]
+        
         db.session.commit()
+        invalidate_tags('inventory')
+        cache_delete(*(lookup_cache_key(barcode) for barcode in barcodes))
         
         return jsonify({
             'success': True,
             'message': 'Inventory received successfully',
-            'product': product.to_dict(),
-            'inventory': inventory_item.to_dict(),
-            'old_quantity': old_quantity,
-            'new_quantity': inventory_item.quantity,
-            'received_quantity': quantity
+            'scan_count': len(scans),
+            'inventory': inventory
         })
         
     except Exception as e:
@@ -142,30 +287,36 @@ def scan_issue():
         if quantity <= 0:
             return jsonify({'success': False, 'error': 'Quantity must be greater than 0'}), 400
         
+        # Compact responses skip the category and warehouse loads
+        compact = wants_compact()
+        
         # Find product by barcode
-        product = Product.query.filter_by(barcode=barcode).first()
+        product = find_product_by_barcode(barcode, *(() if compact else (joinedload(Product.category),)))
         if not product:
             return jsonify({'success': False, 'error': 'Product not found'}), 404
         
-        # Get inventory item
-        inventory_item = Inventory.query.filter_by(
-            product_id=product.id,
-            warehouse_id=warehouse_id
-        ).first()
+        item_filter = (Inventory.product_id == product.id, Inventory.warehouse_id == warehouse_id)
         
-        if not inventory_item:
-            return jsonify({'success': False, 'error': 'No inventory found for this product in the warehouse'}), 404
+        # Decrement atomically; the WHERE clause enforces sufficient stock without a locking read
+        decremented = db.session.execute(
+            update(Inventory)
+            .where(*item_filter, Inventory.quantity >= quantity)
+            .values(quantity=Inventory.quantity - quantity)
+            .execution_options(synchronize_session=False)
+        ).rowcount
         
-        if inventory_item.quantity < quantity:
+        if not decremented:
+            available = db.session.scalar(select(Inventory.quantity).where(*item_filter))
+            if available is None:
+                return jsonify({'success': False, 'error': 'No inventory found for this product in the warehouse'}), 404
             return jsonify({
                 'success': False,
-                'error': f'Insufficient stock. Available: {inventory_item.quantity}, Requested: {quantity}'
+                'error': f'Insufficient stock. Available: {available}, Requested: {quantity}'
             }), 400
         
-        # Update inventory
-        old_quantity = inventory_item.quantity
-        inventory_item.quantity -= quantity
-        inventory_item.last_updated = datetime.utcnow()
+        # Read the updated row back with its warehouse
+        inventory_item = Inventory.query.options(*(() if compact else (joinedload(Inventory.warehouse),))).filter(*item_filter).one()
+        old_quantity = inventory_item.quantity + quantity
         
         # Record stock movement
         stock_movement = StockMovement(
@@ -178,17 +329,26 @@ def scan_issue():
         )
         
         db.session.add(stock_movement)
+        
+        # Serialize before committing so the response doesn't reload expired rows
+        if compact:
+            result = compact_scan_result(product, inventory_item.quantity)
+        else:
+            result = {
+                'success': True,
+                'message': 'Inventory issued successfully',
+                'product': product.to_dict(),
+                'inventory': inventory_item.to_dict(),
+                'old_quantity': old_quantity,
+                'new_quantity': inventory_item.quantity,
+                'issued_quantity': quantity
+            }
+        
         db.session.commit()
+        invalidate_tags('inventory')
+        cache_delete(lookup_cache_key(barcode))
         
-        return jsonify({
-            'success': True,
-            'message': 'Inventory issued successfully',
-            'product': product.to_dict(),
-            'inventory': inventory_item.to_dict(),
-            'old_quantity': old_quantity,
-            'new_quantity': inventory_item.quantity,
-            'issued_quantity': quantity
-        })
+        return jsonify(result)
         
     except Exception as e:
         db.session.rollback()
@@ -212,13 +372,16 @@ def scan_count():
         if counted_quantity < 0:
             return jsonify({'success': False, 'error': 'Counted quantity cannot be negative'}), 400
         
+        # Compact responses skip the category and warehouse loads
+        compact = wants_compact()
+        
         # Find product by barcode
-        product = Product.query.filter_by(barcode=barcode).first()
+        product = find_product_by_barcode(barcode, *(() if compact else (joinedload(Product.category),)))
         if not product:
             return jsonify({'success': False, 'error': 'Product not found'}), 404
         
-        # Get or create inventory item
-        inventory_item = Inventory.query.filter_by(
+        # Get or create inventory item with its warehouse
+        inventory_item = Inventory.query.options(*(() if compact else (joinedload(Inventory.warehouse),))).filter_by(
             product_id=product.id,
             warehouse_id=warehouse_id
         ).first()
@@ -239,7 +402,6 @@ def scan_count():
         
         # Update inventory
         inventory_item.quantity = counted_quantity
-        inventory_item.last_updated = datetime.utcnow()
         
         # Record stock movement if there's an adjustment
         if adjustment != 0:
@@ -254,17 +416,27 @@ def scan_count():
             
             db.session.add(stock_movement)
         
+        db.session.flush()
+        
+        # Serialize before committing so the response doesn't reload expired rows
+        if compact:
+            result = compact_scan_result(product, counted_quantity)
+        else:
+            result = {
+                'success': True,
+                'message': 'Stock count completed successfully',
+                'product': product.to_dict(),
+                'inventory': inventory_item.to_dict(),
+                'old_quantity': old_quantity,
+                'counted_quantity': counted_quantity,
+                'adjustment': adjustment
+            }
+        
         db.session.commit()
+        invalidate_tags('inventory')
+        cache_delete(lookup_cache_key(barcode))
         
-        return jsonify({
-            'success': True,
-            'message': 'Stock count completed successfully',
-            'product': product.to_dict(),
-            'inventory': inventory_item.to_dict(),
-            'old_quantity': old_quantity,
-            'counted_quantity': counted_quantity,
-            'adjustment': adjustment
-        })
+        return jsonify(result)
         
     except Exception as e:
         db.session.rollback()
@@ -281,22 +453,27 @@ def generate_barcode():
             return jsonify({'success': False, 'error': 'Product ID is required'}), 400
         
         product_id = data['product_id']
-        product = Product.query.get_or_404(product_id)
+        product = db.session.get(Product, product_id)
+        if product is None:
+            abort(404)
         
         # Generate barcode if not exists
         if not product.barcode:
-            # Simple barcode generation based on product ID and timestamp
-            import time
-            timestamp = str(int(time.time()))[-6:]  # Last 6 digits of timestamp
-            barcode = f"{product_id:06d}{timestamp}"
-            
-            # Ensure uniqueness
-            while Product.query.filter_by(barcode=barcode).first():
-                timestamp = str(int(time.time()))[-6:]
-                barcode = f"{product_id:06d}{timestamp}"
+            # Product ID plus a random suffix; the unique index on barcode catches
+            # the rare clash, so no SELECT is needed before writing
+            for _ in range(BARCODE_ATTEMPTS):
+                barcode = f"{product_id:06d}{secrets.randbelow(10 ** 6):06d}"
+                product.barcode = barcode
+                try:
+                    db.session.commit()
+                    break
+                except IntegrityError:
+                    db.session.rollback()
+            else:
+                return jsonify({'success': False, 'error': 'Could not generate a unique barcode'}), 409
             
-            product.barcode = barcode
-            db.session.commit()
+            cache_delete(product_id_cache_key(barcode))
+        invalidate_tags('products')
         
         return jsonify({
             'success': True,
@@ -320,7 +497,7 @@ def get_barcode_history():
             return jsonify({'success': False, 'error': 'Barcode parameter is required'}), 400
         
         # Find product by barcode
-        product = Product.query.filter_by(barcode=barcode).first()
+        product = find_product_by_barcode(barcode)
         if not product:
             return jsonify({'success': False, 'error': 'Product not found'}), 404
         
@@ -1,5 +1,7 @@
-from flask import Blueprint, request, jsonify
-from models import db, Category
+from flask import Blueprint, request, jsonify, abort
+from models import db, Category, Product
+from services.cache import invalidate_tags
+from sqlalchemy import select, exists
 from sqlalchemy.exc import IntegrityError
 
 categories_bp = Blueprint('categories', __name__)
@@ -21,7 +23,9 @@ def get_categories():
 def get_category(category_id):
     """Get a specific category by ID"""
     try:
-        category = Category.query.get_or_404(category_id)
+        category = db.session.get(Category, category_id)
+        if category is None:
+            abort(404)
         return jsonify({
             'success': True,
             'data': category.to_dict()
@@ -64,7 +68,9 @@ def create_category():
 def update_category(category_id):
     """Update an existing category"""
     try:
-        category = Category.query.get_or_404(category_id)
+        category = db.session.get(Category, category_id)
+        if category is None:
+            abort(404)
         data = request.get_json()
         
         if not data:
@@ -78,6 +84,7 @@ def update_category(category_id):
             category.parent_id = data['parent_id']
         
         db.session.commit()
+        invalidate_tags('products')
         
         return jsonify({
             'success': True,
@@ -96,17 +103,27 @@ def update_category(category_id):
 def delete_category(category_id):
     """Delete a category"""
     try:
-        category = Category.query.get_or_404(category_id)
+        category = db.session.get(Category, category_id)
+        if category is None:
+            abort(404)
+        
+        # Probe for products and subcategories in one round trip instead of loading both collections
+        has_products, has_children = db.session.execute(
+            select(
+                exists().where(Product.category_id == category_id),
+                exists().where(Category.parent_id == category_id)
+            )
+        ).one()
         
         # Check if category has products
-        if category.products:
+        if has_products:
             return jsonify({
                 'success': False, 
                 'error': 'Cannot delete category with existing products'
             }), 409
         
         # Check if category has subcategories
-        if category.children:
+        if has_children:
             return jsonify({
                 'success': False, 
                 'error': 'Cannot delete category with subcategories'
@@ -114,6 +131,7 @@ def delete_category(category_id):
         
         db.session.delete(category)
         db.session.commit()
+        invalidate_tags('products')
         
         return jsonify({
             'success': True,
@@ -128,7 +146,9 @@ def delete_category(category_id):
 def get_subcategories(category_id):
     """Get all subcategories of a specific category"""
     try:
-        category = Category.query.get_or_404(category_id)
+        category = db.session.get(Category, category_id)
+        if category is None:
+            abort(404)
         subcategories = Category.query.filter_by(parent_id=category_id).all()
         
         return jsonify({
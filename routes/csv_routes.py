@@ -1,10 +1,40 @@
-from flask import Blueprint, request, jsonify, make_response
+from flask import Blueprint, Response, request, jsonify, make_response, stream_with_context, url_for
 from flask_jwt_extended import jwt_required
 from services.csv_service import CSVService
-from io import StringIO
+from services.import_jobs import start_import, get_import_job
+from io import StringIO, TextIOWrapper
+from itertools import islice
+import csv
 
 csv_bp = Blueprint('csv', __name__)
 
+# Columns each import type must provide
+REQUIRED_COLUMNS = {
+    'products': ['name', 'sku'],
+    'inventory': ['product_id', 'warehouse_id', 'quantity'],
+    'suppliers': ['name']
+}
+PREVIEW_ROWS = 5
+
+def import_response(job_id, job, label):
+    """Answer an import upload: 202 with a status URL when queued, else the finished import's outcome"""
+    if job['status'] == 'queued':
+        return jsonify({
+            'success': True,
+            'message': f'{label} import started',
+            'job_id': job_id,
+            'status_url': url_for('csv.get_import_status', job_id=job_id)
+        }), 202
+    
+    if job['status'] == 'failed':
+        return jsonify({'success': False, 'error': job['error']}), 500
+    
+    return jsonify({
+        'success': True,
+        'message': f'{label} imported successfully',
+        'results': job['results']
+    })
+
 @csv_bp.route('/export/products', methods=['GET'])
 @jwt_required()
 def export_products():
@@ -15,12 +45,12 @@ def export_products():
         if error:
             return jsonify({'success': False, 'error': error}), 500
         
-        # Create response with CSV content
-        response = make_response(csv_content)
-        response.headers['Content-Type'] = 'text/csv'
-        response.headers['Content-Disposition'] = 'attachment; filename=products_export.csv'
-        
-        return response
+        # Stream CSV chunks as the rows are fetched
+        return Response(
+            stream_with_context(csv_content),
+            mimetype='text/csv',
+            headers={'Content-Disposition': 'attachment; filename=products_export.csv'}
+        )
         
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -35,12 +65,12 @@ def export_inventory():
         if error:
             return jsonify({'success': False, 'error': error}), 500
         
-        # Create response with CSV content
-        response = make_response(csv_content)
-        response.headers['Content-Type'] = 'text/csv'
-        response.headers['Content-Disposition'] = 'attachment; filename=inventory_export.csv'
-        
-        return response
+        # Stream CSV chunks as the rows are fetched
+        return Response(
+            stream_with_context(csv_content),
+            mimetype='text/csv',
+            headers={'Content-Disposition': 'attachment; filename=inventory_export.csv'}
+        )
         
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -55,12 +85,12 @@ def export_suppliers():
         if error:
             return jsonify({'success': False, 'error': error}), 500
         
-        # Create response with CSV content
-        response = make_response(csv_content)
-        response.headers['Content-Type'] = 'text/csv'
-        response.headers['Content-Disposition'] = 'attachment; filename=suppliers_export.csv'
-        
-        return response
+        # Stream CSV chunks as the rows are fetched
+        return Response(
+            stream_with_context(csv_content),
+            mimetype='text/csv',
+            headers={'Content-Disposition': 'attachment; filename=suppliers_export.csv'}
+        )
         
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -82,21 +112,13 @@ def import_products():
         if not file.filename.endswith('.csv'):
             return jsonify({'success': False, 'error': 'File must be CSV format'}), 400
         
-        # Read file content
-        csv_content = file.read().decode('utf-8')
         update_existing = request.form.get('update_existing', 'false').lower() == 'true'
         
-        # Import products
-        results, error = CSVService.import_products(csv_content, update_existing)
+        # Import in the background so large files don't hold the worker and a pooled connection
+        # (inline when there is no Redis to share the job status across workers)
+        job_id, job = start_import('products', file, update_existing)
         
-        if error:
-            return jsonify({'success': False, 'error': error}), 500
-        
-        return jsonify({
-            'success': True,
-            'message': 'Products imported successfully',
-            'results': results
-        })
+        return import_response(job_id, job, 'Products')
         
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -118,20 +140,31 @@ def import_inventory():
         if not file.filename.endswith('.csv'):
             return jsonify({'success': False, 'error': 'File must be CSV format'}), 400
         
-        # Read file content
-        csv_content = file.read().decode('utf-8')
         update_existing = request.form.get('update_existing', 'false').lower() == 'true'
         
-        # Import inventory
-        results, error = CSVService.import_inventory(csv_content, update_existing)
+        # Import in the background so large files don't hold the worker and a pooled connection
+        # (inline when there is no Redis to share the job status across workers)
+        job_id, job = start_import('inventory', file, update_existing)
         
-        if error:
-            return jsonify({'success': False, 'error': error}), 500
+        return import_response(job_id, job, 'Inventory')
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@csv_bp.route('/import/status/<job_id>', methods=['GET'])
+@jwt_required()
+def get_import_status(job_id):
+    """Get the status of a background CSV import"""
+    try:
+        job = get_import_job(job_id)
+        
+        if job is None:
+            return jsonify({'success': False, 'error': 'Import job not found'}), 404
         
         return jsonify({
             'success': True,
-            'message': 'Inventory imported successfully',
-            'results': results
+            'job_id': job_id,
+            'data': job
         })
         
     except Exception as e:
@@ -172,37 +205,27 @@ def validate_csv():
         file = request.files['file']
         data_type = request.form.get('data_type')
         
-        if not data_type or data_type not in ['products', 'inventory', 'suppliers']:
+        if not data_type or data_type not in REQUIRED_COLUMNS:
             return jsonify({'success': False, 'error': 'Invalid data type'}), 400
         
         # Check file type
         if not file.filename.endswith('.csv'):
             return jsonify({'success': False, 'error': 'File must be CSV format'}), 400
         
-        # Read and validate file content
-        csv_content = file.read().decode('utf-8')
-        
-        # Basic validation
-        import pandas as pd
-        import io
-        
-        df = pd.read_csv(io.StringIO(csv_content))
-        
-        # Define required columns for each data type
-        required_columns = {
-            'products': ['name', 'sku'],
-            'inventory': ['product_id', 'warehouse_id', 'quantity'],
-            'suppliers': ['name']
-        }
+        # Basic validation: check the header and preview a few rows without a full parse
+        reader = csv.reader(TextIOWrapper(file.stream, encoding='utf-8-sig', newline=''))
+        headers = next(reader, [])
         
-        missing_columns = [col for col in required_columns[data_type] if col not in df.columns]
+        missing_columns = [col for col in REQUIRED_COLUMNS[data_type] if col not in headers]
+        preview = [dict(zip(headers, row)) for row in islice(reader, PREVIEW_ROWS)]
+        row_count = len(preview) + sum(1 for _ in reader)
         
         validation_result = {
-            'row_count': len(df),
-            'columns': list(df.columns),
+            'row_count': row_count,
+            'columns': headers,
             'missing_columns': missing_columns,
             'is_valid': len(missing_columns) == 0,
-            'preview': df.head(5).to_dict('records') if len(df) > 0 else []
+            'preview': preview
         }
         
         return jsonify({
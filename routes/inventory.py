@@ -1,36 +1,87 @@
 from flask import Blueprint, request, jsonify
 from models import db, Inventory, Product, Warehouse, StockMovement
+from services.cache import cached_response, invalidate_tags
+from services.inventory_service import inventory_upsert
+from routes.query_args import parse_bool
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy import and_
-from datetime import datetime
+from sqlalchemy import and_, exists, func, insert, or_, select, true, update
+from math import ceil
 
 inventory_bp = Blueprint('inventory', __name__)
 
+# Fields a PUT may change
+INVENTORY_UPDATABLE_FIELDS = frozenset(('quantity', 'reorder_level', 'max_stock_level'))
+
+# List endpoints read plain rows with the joined names instead of hydrating ORM objects
+INVENTORY_LIST_COLUMNS = (
+    Inventory.id, Inventory.product_id, Inventory.warehouse_id, Inventory.quantity,
+    Inventory.reorder_level, Inventory.max_stock_level, Inventory.is_low_stock, Inventory.last_updated,
+    Product.name.label('product_name'), Product.sku.label('product_sku'),
+    Warehouse.name.label('warehouse_name')
+)
+
+MOVEMENT_LIST_COLUMNS = (
+    StockMovement.id, StockMovement.product_id, StockMovement.warehouse_id,
+    StockMovement.movement_type, StockMovement.quantity, StockMovement.reference_type,
+    StockMovement.reference_id, StockMovement.notes, StockMovement.created_at,
+    Product.name.label('product_name'), Product.sku.label('product_sku'),
+    Warehouse.name.label('warehouse_name')
+)
+
+def paginate_rows(stmt, count_stmt, page, per_page):
+    """Fetch one page of a Core select as dicts, with the pagination block paginate() reports"""
+    page, per_page = max(page, 1), max(per_page, 1)
+    total = db.session.scalar(count_stmt)
+    rows = db.session.execute(stmt.limit(per_page).offset((page - 1) * per_page)).mappings()
+    pages = ceil(total / per_page)
+    
+    return [dict(row) for row in rows], {
+        'page': page,
+        'per_page': per_page,
+        'total': total,
+        'pages': pages,
+        'has_next': page < pages,
+        'has_prev': page > 1
+    }
+
 @inventory_bp.route('', methods=['GET'])
+@cached_response('inventory')
 def get_inventory():
     """Get inventory with optional filtering"""
     try:
+        page = request.args.get('page', 1, type=int)
+        per_page = min(request.args.get('per_page', 20, type=int), 100)
         warehouse_id = request.args.get('warehouse_id', type=int)
         product_id = request.args.get('product_id', type=int)
-        low_stock = request.args.get('low_stock', type=bool)
+        low_stock = request.args.get('low_stock', type=parse_bool)
         
-        query = Inventory.query
+        criteria = []
         
         if warehouse_id:
-            query = query.filter_by(warehouse_id=warehouse_id)
+            criteria.append(Inventory.warehouse_id == warehouse_id)
         
         if product_id:
-            query = query.filter_by(product_id=product_id)
+            criteria.append(Inventory.product_id == product_id)
         
         if low_stock:
-            query = query.filter(Inventory.quantity <= Inventory.reorder_level)
-        
-        inventory_items = query.all()
+            criteria.append(Inventory.is_low_stock == true())
+        
+        # Paginate results; the total comes from a COUNT query instead of loading every row
+        items, pagination = paginate_rows(
+            select(*INVENTORY_LIST_COLUMNS)
+            .join(Product, Inventory.product_id == Product.id)
+            .join(Warehouse, Inventory.warehouse_id == Warehouse.id)
+            .where(*criteria)
+            .order_by(Inventory.id),
+            select(func.count(Inventory.id)).where(*criteria),
+            page, per_page
+        )
         
         return jsonify({
             'success': True,
-            'data': [item.to_dict() for item in inventory_items],
-            'count': len(inventory_items)
+            'data': items,
+            'count': pagination['total'],
+            'pagination': pagination
         })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -59,27 +110,8 @@ def create_inventory_item():
                 'error': 'Product ID and Warehouse ID are required'
             }), 400
         
-        # Check if product and warehouse exist
-        product = Product.query.get(data['product_id'])
-        warehouse = Warehouse.query.get(data['warehouse_id'])
-        
-        if not product:
-            return jsonify({'success': False, 'error': 'Product not found'}), 404
-        if not warehouse:
-            return jsonify({'success': False, 'error': 'Warehouse not found'}), 404
-        
-        # Check if inventory item already exists
-        existing = Inventory.query.filter_by(
-            product_id=data['product_id'],
-            warehouse_id=data['warehouse_id']
-        ).first()
-        
-        if existing:
-            return jsonify({
-                'success': False, 
-                'error': 'Inventory item already exists for this product-warehouse combination'
-            }), 409
-        
+        # Missing products/warehouses and duplicates are rejected by the foreign keys and the
+        # product/warehouse unique constraint, so the happy path is a single INSERT
         inventory_item = Inventory(
             product_id=data['product_id'],
             warehouse_id=data['warehouse_id'],
@@ -90,6 +122,7 @@ def create_inventory_item():
         
         db.session.add(inventory_item)
         db.session.commit()
+        invalidate_tags('inventory')
         
         return jsonify({
             'success': True,
@@ -97,6 +130,26 @@ def create_inventory_item():
             'message': 'Inventory item created successfully'
         }), 201
         
+    except IntegrityError:
+        db.session.rollback()
+        
+        # Work out which constraint failed with one probe (only on the error path)
+        product_exists, warehouse_exists = db.session.execute(
+            select(
+                exists().where(Product.id == data['product_id']),
+                exists().where(Warehouse.id == data['warehouse_id'])
+            )
+        ).one()
+        
+        if not product_exists:
+            return jsonify({'success': False, 'error': 'Product not found'}), 404
+        if not warehouse_exists:
+            return jsonify({'success': False, 'error': 'Warehouse not found'}), 404
+        
+        return jsonify({
+            'success': False, 
+            'error': 'Inventory item already exists for this product-warehouse combination'
+        }), 409
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -112,13 +165,11 @@ def update_inventory_item(inventory_id):
             return jsonify({'success': False, 'error': 'No data provided'}), 400
         
         # Update fields
-        updatable_fields = ['quantity', 'reorder_level', 'max_stock_level']
-        
-        for field in updatable_fields:
-            if field in data:
-                setattr(inventory_item, field, data[field])
+        for field in data.keys() & INVENTORY_UPDATABLE_FIELDS:
+            setattr(inventory_item, field, data[field])
         
         db.session.commit()
+        invalidate_tags('inventory')
         
         return jsonify({
             'success': True,
@@ -143,57 +194,67 @@ def adjust_inventory():
                 'error': 'Product ID, Warehouse ID, quantity change, and movement type are required'
             }), 400
         
-        # Get or create inventory item
-        inventory_item = Inventory.query.filter_by(
-            product_id=data['product_id'],
-            warehouse_id=data['warehouse_id']
-        ).first()
-        
-        if not inventory_item:
-            # Create new inventory item if it doesn't exist
-            inventory_item = Inventory(
-                product_id=data['product_id'],
-                warehouse_id=data['warehouse_id'],
-                quantity=0,
-                reorder_level=data.get('reorder_level', 10),
-                max_stock_level=data.get('max_stock_level', 1000)
-            )
-            db.session.add(inventory_item)
-        
-        # Update quantity
-        new_quantity = inventory_item.quantity + data['quantity_change']
-        
-        if new_quantity < 0:
-            return jsonify({
-                'success': False, 
-                'error': 'Insufficient stock for this operation'
-            }), 400
+        quantity_change = data['quantity_change']
+        item_filter = (
+            Inventory.product_id == data['product_id'],
+            Inventory.warehouse_id == data['warehouse_id']
+        )
         
-        inventory_item.quantity = new_quantity
-        inventory_item.last_updated = datetime.utcnow()
+        if quantity_change >= 0:
+            # Create the row or add to it in one statement, so concurrent first adjustments can't race
+            db.session.execute(inventory_upsert(), {
+                'product_id': data['product_id'],
+                'warehouse_id': data['warehouse_id'],
+                'quantity': quantity_change,
+                'reorder_level': data.get('reorder_level', 10),
+                'max_stock_level': data.get('max_stock_level', 1000)
+            })
+        else:
+            # Apply the decrease atomically; the WHERE clause keeps stock from going negative
+            adjusted = db.session.execute(
+                update(Inventory)
+                .where(*item_filter, Inventory.quantity + quantity_change >= 0)
+                .values(quantity=Inventory.quantity + quantity_change)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            
+            if not adjusted:
+                # Either the stock is too low or there is no row to take from
+                return jsonify({
+                    'success': False, 
+                    'error': 'Insufficient stock for this operation'
+                }), 400
+        
+        inventory_item = Inventory.query.filter(*item_filter).one()
         
         # Record stock movement
         stock_movement = StockMovement(
             product_id=data['product_id'],
             warehouse_id=data['warehouse_id'],
             movement_type=data['movement_type'],
-            quantity=abs(data['quantity_change']),
+            quantity=abs(quantity_change),
             reference_type=data.get('reference_type'),
             reference_id=data.get('reference_id'),
             notes=data.get('notes')
         )
         
         db.session.add(stock_movement)
-        db.session.commit()
+        db.session.flush()
         
-        return jsonify({
+        # Serialize before committing so the response doesn't reload expired rows
+        result = {
             'success': True,
             'data': {
                 'inventory': inventory_item.to_dict(),
                 'movement': stock_movement.to_dict()
             },
             'message': 'Inventory adjusted successfully'
-        })
+        }
+        
+        db.session.commit()
+        invalidate_tags('inventory')
+        
+        return jsonify(result)
         
     except Exception as e:
         db.session.rollback()
@@ -212,11 +273,15 @@ def transfer_inventory():
                 'error': 'Product ID, source warehouse, destination warehouse, and quantity are required'
             }), 400
         
-        # Get source inventory
-        source_inventory = Inventory.query.filter_by(
-            product_id=data['product_id'],
-            warehouse_id=data['from_warehouse_id']
-        ).first()
+        # Lock both rows in one query, in warehouse order so concurrent transfers can't deadlock
+        locked = {
+            item.warehouse_id: item
+            for item in Inventory.query.filter(
+                Inventory.product_id == data['product_id'],
+                Inventory.warehouse_id.in_([data['from_warehouse_id'], data['to_warehouse_id']])
+            ).order_by(Inventory.warehouse_id).with_for_update().all()
+        }
+        source_inventory = locked.get(data['from_warehouse_id'])
         
         if not source_inventory or source_inventory.quantity < data['quantity']:
             return jsonify({
@@ -225,10 +290,7 @@ def transfer_inventory():
             }), 400
         
         # Get or create destination inventory
-        dest_inventory = Inventory.query.filter_by(
-            product_id=data['product_id'],
-            warehouse_id=data['to_warehouse_id']
-        ).first()
+        dest_inventory = locked.get(data['to_warehouse_id'])
         
         if not dest_inventory:
             dest_inventory = Inventory(
@@ -244,30 +306,28 @@ def transfer_inventory():
         source_inventory.quantity -= data['quantity']
         dest_inventory.quantity += data['quantity']
         
-        # Record stock movements
-        movements = [
-            StockMovement(
-                product_id=data['product_id'],
-                warehouse_id=data['from_warehouse_id'],
-                movement_type='out',
-                quantity=data['quantity'],
-                reference_type='transfer',
-                notes=f"Transfer to warehouse {data['to_warehouse_id']}"
-            ),
-            StockMovement(
-                product_id=data['product_id'],
-                warehouse_id=data['to_warehouse_id'],
-                movement_type='in',
-                quantity=data['quantity'],
-                reference_type='transfer',
-                notes=f"Transfer from warehouse {data['from_warehouse_id']}"
-            )
-        ]
-        
-        for movement in movements:
-            db.session.add(movement)
+        # Record both stock movements in one executemany INSERT
+        db.session.execute(insert(StockMovement), [
+            {
+                'product_id': data['product_id'],
+                'warehouse_id': data['from_warehouse_id'],
+                'movement_type': 'out',
+                'quantity': data['quantity'],
+                'reference_type': 'transfer',
+                'notes': f"Transfer to warehouse {data['to_warehouse_id']}"
+            },
+            {
+                'product_id': data['product_id'],
+                'warehouse_id': data['to_warehouse_id'],
+                'movement_type': 'in',
+                'quantity': data['quantity'],
+                'reference_type': 'transfer',
+                'notes': f"Transfer from warehouse {data['from_warehouse_id']}"
+            }
+        ])
         
         db.session.commit()
+        invalidate_tags('inventory')
         
         return jsonify({
             'success': True,
@@ -283,17 +343,28 @@ def transfer_inventory():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @inventory_bp.route('/low-stock', methods=['GET'])
+@cached_response('inventory')
 def get_low_stock_items():
     """Get all inventory items with low stock"""
     try:
-        low_stock_items = Inventory.query.filter(
-            Inventory.quantity <= Inventory.reorder_level
-        ).all()
+        page = request.args.get('page', 1, type=int)
+        per_page = min(request.args.get('per_page', 20, type=int), 100)
+        
+        low_stock_items, pagination = paginate_rows(
+            select(*INVENTORY_LIST_COLUMNS)
+            .join(Product, Inventory.product_id == Product.id)
+            .join(Warehouse, Inventory.warehouse_id == Warehouse.id)
+            .where(Inventory.is_low_stock == true())
+            .order_by(Inventory.id),
+            select(func.count(Inventory.id)).where(Inventory.is_low_stock == true()),
+            page, per_page
+        )
         
         return jsonify({
             'success': True,
-            'data': [item.to_dict() for item in low_stock_items],
-            'count': len(low_stock_items),
+            'data': low_stock_items,
+            'count': pagination['total'],
+            'pagination': pagination,
             'message': 'Low stock items retrieved successfully'
         })
         
@@ -304,27 +375,61 @@ def get_low_stock_items():
 def get_stock_movements():
     """Get stock movement history with optional filtering"""
     try:
+        page = request.args.get('page', 1, type=int)
+        per_page = max(min(request.args.get('per_page', 50, type=int), 500), 1)  # Bound unfiltered history scans
         product_id = request.args.get('product_id', type=int)
         warehouse_id = request.args.get('warehouse_id', type=int)
         movement_type = request.args.get('movement_type')
+        after_id = request.args.get('after_id', type=int)
         
-        query = StockMovement.query
+        criteria = []
         
         if product_id:
-            query = query.filter_by(product_id=product_id)
+            criteria.append(StockMovement.product_id == product_id)
         
         if warehouse_id:
-            query = query.filter_by(warehouse_id=warehouse_id)
+            criteria.append(StockMovement.warehouse_id == warehouse_id)
         
         if movement_type:
-            query = query.filter_by(movement_type=movement_type)
+            criteria.append(StockMovement.movement_type == movement_type)
+        
+        stmt = (
+            select(*MOVEMENT_LIST_COLUMNS)
+            .join(Product, StockMovement.product_id == Product.id)
+            .join(Warehouse, StockMovement.warehouse_id == Warehouse.id)
+            .where(*criteria)
+            .order_by(StockMovement.created_at.desc(), StockMovement.id.desc())
+        )
         
-        movements = query.order_by(StockMovement.created_at.desc()).all()
+        # Keyset pagination: seek past the (created_at, id) of the last movement seen;
+        # an empty after_id starts from the top
+        if 'after_id' in request.args:
+            if after_id is not None:
+                after_created_at = (
+                    select(StockMovement.created_at).where(StockMovement.id == after_id).scalar_subquery()
+                )
+                stmt = stmt.where(or_(
+                    StockMovement.created_at < after_created_at,
+                    and_(StockMovement.created_at == after_created_at, StockMovement.id < after_id)
+                ))
+            movements = [dict(row) for row in db.session.execute(stmt.limit(per_page)).mappings()]
+            
+            return jsonify({
+                'success': True,
+                'data': movements,
+                'count': len(movements),
+                'next_after_id': movements[-1]['id'] if len(movements) == per_page else None
+            })
+        
+        movements, pagination = paginate_rows(
+            stmt, select(func.count(StockMovement.id)).where(*criteria), page, per_page
+        )
         
         return jsonify({
             'success': True,
-            'data': [movement.to_dict() for movement in movements],
-            'count': len(movements)
+            'data': movements,
+            'count': pagination['total'],
+            'pagination': pagination
         })
         
     except Exception as e:
@@ -1,29 +1,58 @@
 from flask import Blueprint, request, jsonify
 from models import db, Product, Category
+from services.cache import cached_response, invalidate_tags
+from routes.query_args import parse_bool
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy import or_
+from sqlalchemy.dialects.mysql import match
+from sqlalchemy.orm import joinedload
+import re
 
 products_bp = Blueprint('products', __name__)
 
+# Fields a PUT may change
+PRODUCT_UPDATABLE_FIELDS = frozenset((
+    'name', 'description', 'sku', 'category_id',
+    'specifications', 'unit_price', 'is_active'
+))
+
+# InnoDB's default innodb_ft_min_token_size; shorter words aren't in the FULLTEXT index
+FULLTEXT_MIN_WORD = 3
+
+def product_search_filter(search):
+    """Build the search predicate, using the FULLTEXT index on MySQL when the terms allow it"""
+    words = re.findall(r'\w+', search)
+    
+    if db.session.get_bind().dialect.name == 'mysql' and words and all(len(word) >= FULLTEXT_MIN_WORD for word in words):
+        # Every word must appear as a word prefix; SKUs are matched by prefix on their unique index
+        return or_(
+            match(Product.name, Product.description, against=' '.join(f'+{word}*' for word in words)).in_boolean_mode(),
+            Product.sku.startswith(search)
+        )
+    
+    return or_(
+        Product.name.contains(search),
+        Product.description.contains(search),
+        Product.sku.contains(search)
+    )
+
 @products_bp.route('', methods=['GET'])
+@cached_response('products')
 def get_products():
     """Get all products with optional filtering and search"""
     try:
         page = request.args.get('page', 1, type=int)
-        per_page = min(request.args.get('per_page', 20, type=int), 100)
+        per_page = max(min(request.args.get('per_page', 20, type=int), 100), 1)
         search = request.args.get('search', '')
         category_id = request.args.get('category_id', type=int)
-        is_active = request.args.get('is_active', type=bool)
+        is_active = request.args.get('is_active', type=parse_bool)
+        after_id = request.args.get('after_id', type=int)
         
-        query = Product.query
+        query = Product.query.options(joinedload(Product.category))
         
         # Apply filters
         if search:
-            query = query.filter(or_(
-                Product.name.contains(search),
-                Product.description.contains(search),
-                Product.sku.contains(search)
-            ))
+            query = query.filter(product_search_filter(search))
         
         if category_id:
             query = query.filter_by(category_id=category_id)
@@ -31,8 +60,22 @@ def get_products():
         if is_active is not None:
             query = query.filter_by(is_active=is_active)
         
-        # Paginate results
-        products = query.paginate(
+        # Keyset pagination: seek past the last id seen instead of counting and skipping rows;
+        # an empty after_id starts from the top
+        if 'after_id' in request.args:
+            if after_id is not None:
+                query = query.filter(Product.id < after_id)
+            products = query.order_by(Product.id.desc()).limit(per_page).all()
+            
+            return jsonify({
+                'success': True,
+                'data': [product.to_dict() for product in products],
+                'count': len(products),
+                'next_after_id': products[-1].id if len(products) == per_page else None
+            })
+        
+        # Paginate results in id order, as page clients have always seen them
+        products = query.order_by(Product.id).paginate(
             page=page, per_page=per_page, error_out=False
         )
         
@@ -97,6 +140,7 @@ def create_product():
         
         db.session.add(product)
         db.session.commit()
+        invalidate_tags('products')
         
         return jsonify({
             'success': True,
@@ -131,14 +175,11 @@ def update_product(product_id):
                 }), 404
         
         # Update fields
-        updatable_fields = ['name', 'description', 'sku', 'category_id', 
-                           'specifications', 'unit_price', 'is_active']
-        
-        for field in updatable_fields:
-            if field in data:
-                setattr(product, field, data[field])
+        for field in data.keys() & PRODUCT_UPDATABLE_FIELDS:
+            setattr(product, field, data[field])
         
         db.session.commit()
+        invalidate_tags('products', 'inventory')
         
         return jsonify({
             'success': True,
@@ -168,6 +209,7 @@ def delete_product(product_id):
         
         db.session.delete(product)
         db.session.commit()
+        invalidate_tags('products', 'inventory')
         
         return jsonify({
             'success': True,
@@ -179,17 +221,31 @@ def delete_product(product_id):
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @products_bp.route('/by-category/<int:category_id>', methods=['GET'])
+@cached_response('products')
 def get_products_by_category(category_id):
     """Get all products in a specific category"""
     try:
+        page = request.args.get('page', 1, type=int)
+        per_page = max(min(request.args.get('per_page', 20, type=int), 100), 1)
+        
         category = Category.query.get_or_404(category_id)
-        products = Product.query.filter_by(category_id=category_id, is_active=True).all()
+        products = Product.query.filter_by(category_id=category_id, is_active=True).order_by(Product.id).paginate(
+            page=page, per_page=per_page, error_out=False
+        )
         
         return jsonify({
             'success': True,
-            'data': [product.to_dict() for product in products],
-            'count': len(products),
-            'category': category.name
+            'data': [product.to_dict() for product in products.items],
+            'count': products.total,
+            'category': category.name,
+            'pagination': {
+                'page': page,
+                'per_page': per_page,
+                'total': products.total,
+                'pages': products.pages,
+                'has_next': products.has_next,
+                'has_prev': products.has_prev
+            }
         })
         
     except Exception as e:
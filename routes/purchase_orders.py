@@ -1,6 +1,10 @@
 from flask import Blueprint, request, jsonify
-from models import db, PurchaseOrder, PurchaseOrderItem, Supplier, Product, Inventory, StockMovement
+from models import db, PurchaseOrder, PurchaseOrderItem, Supplier, Product, StockMovement
+from services.cache import cached_response, invalidate_tags
+from services.inventory_service import inventory_upsert
+from sqlalchemy import and_, func, insert, or_, select
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, selectinload, raiseload
 from datetime import datetime
 import uuid
 
@@ -8,20 +12,21 @@ purchase_orders_bp = Blueprint('purchase_orders', __name__)
 
 def generate_order_number():
     """Generate a unique order number"""
-    timestamp = datetime.now().strftime('%Y%m%d')
-    unique_id = str(uuid.uuid4())[:8].upper()
-    return f"PO-{timestamp}-{unique_id}"
+    return f"PO-{datetime.now():%Y%m%d}-{uuid.uuid4().hex[:8].upper()}"
 
 @purchase_orders_bp.route('', methods=['GET'])
+@cached_response('purchase_orders')
 def get_purchase_orders():
     """Get all purchase orders with optional filtering"""
     try:
         supplier_id = request.args.get('supplier_id', type=int)
         status = request.args.get('status')
         page = request.args.get('page', 1, type=int)
-        per_page = min(request.args.get('per_page', 20, type=int), 100)
+        per_page = max(min(request.args.get('per_page', 20, type=int), 100), 1)
+        after_id = request.args.get('after_id', type=int)
         
-        query = PurchaseOrder.query
+        # to_dict reads the supplier name; items_count is a SQL column, so items stay unloaded
+        query = PurchaseOrder.query.options(joinedload(PurchaseOrder.supplier), raiseload('*'))
         
         if supplier_id:
             query = query.filter_by(supplier_id=supplier_id)
@@ -29,8 +34,28 @@ def get_purchase_orders():
         if status:
             query = query.filter_by(status=status)
         
+        # Keyset pagination: seek past the (created_at, id) of the last order seen;
+        # an empty after_id starts from the top
+        if 'after_id' in request.args:
+            if after_id is not None:
+                after_created_at = (
+                    select(PurchaseOrder.created_at).where(PurchaseOrder.id == after_id).scalar_subquery()
+                )
+                query = query.filter(or_(
+                    PurchaseOrder.created_at < after_created_at,
+                    and_(PurchaseOrder.created_at == after_created_at, PurchaseOrder.id < after_id)
+                ))
+            purchase_orders = query.order_by(PurchaseOrder.created_at.desc(), PurchaseOrder.id.desc()).limit(per_page).all()
+            
+            return jsonify({
+                'success': True,
+                'data': [po.to_dict() for po in purchase_orders],
+                'count': len(purchase_orders),
+                'next_after_id': purchase_orders[-1].id if len(purchase_orders) == per_page else None
+            })
+        
         # Paginate results
-        purchase_orders = query.order_by(PurchaseOrder.created_at.desc()).paginate(
+        purchase_orders = query.order_by(PurchaseOrder.created_at.desc(), PurchaseOrder.id.desc()).paginate(
             page=page, per_page=per_page, error_out=False
         )
         
@@ -54,7 +79,11 @@ def get_purchase_orders():
 def get_purchase_order(po_id):
     """Get a specific purchase order by ID"""
     try:
-        purchase_order = PurchaseOrder.query.get_or_404(po_id)
+        purchase_order = PurchaseOrder.query.options(
+            joinedload(PurchaseOrder.supplier),
+            selectinload(PurchaseOrder.items).selectinload(PurchaseOrderItem.product),
+            raiseload('*')
+        ).get_or_404(po_id)
         po_data = purchase_order.to_dict()
         po_data['items'] = [item.to_dict() for item in purchase_order.items]
         
@@ -82,6 +111,24 @@ def create_purchase_order():
         if not supplier:
             return jsonify({'success': False, 'error': 'Supplier not found'}), 404
         
+        for item_data in data['items']:
+            if not item_data.get('product_id') or not item_data.get('quantity') or not item_data.get('unit_price'):
+                return jsonify({
+                    'success': False, 
+                    'error': 'Product ID, quantity, and unit price are required for all items'
+                }), 400
+        
+        # Verify all products exist with one query
+        product_ids = {item_data['product_id'] for item_data in data['items']}
+        found_ids = set(db.session.scalars(select(Product.id).where(Product.id.in_(product_ids))))
+        missing_ids = sorted(product_ids - found_ids)
+        if missing_ids:
+            return jsonify({
+                'success': False, 
+                'error': f"Products not found: {', '.join(str(product_id) for product_id in missing_ids)}",
+                'missing_product_ids': missing_ids
+            }), 404
+        
         # Create purchase order
         purchase_order = PurchaseOrder(
             order_number=generate_order_number(),
@@ -94,36 +141,21 @@ def create_purchase_order():
         db.session.add(purchase_order)
         db.session.flush()  # Get the ID
         
-        total_amount = 0
-        
-        # Create purchase order items
-        for item_data in data['items']:
-            if not item_data.get('product_id') or not item_data.get('quantity') or not item_data.get('unit_price'):
-                return jsonify({
-                    'success': False, 
-                    'error': 'Product ID, quantity, and unit price are required for all items'
-                }), 400
-            
-            # Verify product exists
-            product = Product.query.get(item_data['product_id'])
-            if not product:
-                return jsonify({
-                    'success': False, 
-                    'error': f"Product with ID {item_data['product_id']} not found"
-                }), 404
-            
-            po_item = PurchaseOrderItem(
-                purchase_order_id=purchase_order.id,
-                product_id=item_data['product_id'],
-                quantity=item_data['quantity'],
-                unit_price=item_data['unit_price']
-            )
-            
-            db.session.add(po_item)
-            total_amount += item_data['quantity'] * item_data['unit_price']
+        # Create purchase order items in one executemany INSERT
+        rows = [
+            {
+                'purchase_order_id': purchase_order.id,
+                'product_id': item_data['product_id'],
+                'quantity': item_data['quantity'],
+                'unit_price': item_data['unit_price']
+            }
+            for item_data in data['items']
+        ]
+        db.session.execute(insert(PurchaseOrderItem), rows)
         
-        purchase_order.total_amount = total_amount
+        purchase_order.total_amount = sum(row['quantity'] * row['unit_price'] for row in rows)
         db.session.commit()
+        invalidate_tags('purchase_orders')
         
         # Get complete data with items
         po_data = purchase_order.to_dict()
@@ -167,6 +199,7 @@ def update_purchase_order(po_id):
                     setattr(purchase_order, field, data[field])
         
         db.session.commit()
+        invalidate_tags('purchase_orders')
         
         return jsonify({
             'success': True,
@@ -192,6 +225,7 @@ def approve_purchase_order(po_id):
         
         purchase_order.status = 'approved'
         db.session.commit()
+        invalidate_tags('purchase_orders')
         
         return jsonify({
             'success': True,
@@ -222,50 +256,48 @@ def receive_purchase_order(po_id):
                 'error': 'Warehouse ID and received items are required'
             }), 400
         
-        # Process received items
+        # Match received lines against this order's items, loaded in one query
+        items_by_id = {item.id: item for item in purchase_order.items}
+        received_lines = []
         for received_item in data['received_items']:
-            po_item_id = received_item.get('po_item_id')
+            po_item = items_by_id.get(received_item.get('po_item_id'))
             received_quantity = received_item.get('received_quantity', 0)
             
-            if not po_item_id or received_quantity <= 0:
-                continue
-            
-            po_item = PurchaseOrderItem.query.get(po_item_id)
-            if not po_item or po_item.purchase_order_id != po_id:
-                continue
-            
+            if po_item and received_quantity > 0:
+                received_lines.append((po_item, received_quantity))
+        
+        # Process received items
+        received_totals = {}
+        movements = []
+        for po_item, received_quantity in received_lines:
             # Update received quantity
             po_item.received_quantity += received_quantity
-            
-            # Update inventory
-            inventory_item = Inventory.query.filter_by(
-                product_id=po_item.product_id,
-                warehouse_id=data['warehouse_id']
-            ).first()
-            
-            if not inventory_item:
-                inventory_item = Inventory(
-                    product_id=po_item.product_id,
-                    warehouse_id=data['warehouse_id'],
-                    quantity=0,
-                    reorder_level=10,
-                    max_stock_level=1000
-                )
-                db.session.add(inventory_item)
-            
-            inventory_item.quantity += received_quantity
+            received_totals[po_item.product_id] = received_totals.get(po_item.product_id, 0) + received_quantity
             
             # Record stock movement
-            stock_movement = StockMovement(
-                product_id=po_item.product_id,
-                warehouse_id=data['warehouse_id'],
-                movement_type='in',
-                quantity=received_quantity,
-                reference_type='purchase_order',
-                reference_id=po_id,
-                notes=f"Received from PO {purchase_order.order_number}"
-            )
-            db.session.add(stock_movement)
+            movements.append({
+                'product_id': po_item.product_id,
+                'warehouse_id': data['warehouse_id'],
+                'movement_type': 'in',
+                'quantity': received_quantity,
+                'reference_type': 'purchase_order',
+                'reference_id': po_id,
+                'notes': f"Received from PO {purchase_order.order_number}"
+            })
+        
+        if movements:
+            # Create or add to every inventory row in one executemany upsert
+            db.session.execute(inventory_upsert(), [
+                {
+                    'product_id': product_id,
+                    'warehouse_id': data['warehouse_id'],
+                    'quantity': quantity,
+                    'reorder_level': 10,
+                    'max_stock_level': 1000
+                }
+                for product_id, quantity in received_totals.items()
+            ])
+            db.session.execute(insert(StockMovement), movements)
         
         # Check if all items are fully received
         all_received = all(
@@ -275,9 +307,10 @@ def receive_purchase_order(po_id):
         
         if all_received:
             purchase_order.status = 'received'
-            purchase_order.actual_delivery = datetime.utcnow()
+            purchase_order.actual_delivery = func.now()
         
         db.session.commit()
+        invalidate_tags('inventory', 'purchase_orders')
         
         return jsonify({
             'success': True,
@@ -303,6 +336,7 @@ def cancel_purchase_order(po_id):
         
         purchase_order.status = 'cancelled'
         db.session.commit()
+        invalidate_tags('purchase_orders')
         
         return jsonify({
             'success': True,
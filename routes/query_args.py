@@ -0,0 +1,3 @@
+def parse_bool(value):
+    """Parse a boolean query argument; use as `request.args.get(name, type=parse_bool)`"""
+    return value.lower() in ('1', 'true', 'yes', 'on')
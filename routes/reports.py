@@ -1,49 +1,67 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from json_provider import stream_json_rows
 from models import db, Product, Inventory, StockMovement, PurchaseOrder, Warehouse
-from sqlalchemy import func, desc, and_
+from services.cache import cached_response, conditional_response
+from sqlalchemy import func, desc, and_, or_, select, true
 from datetime import datetime, timedelta
 
 reports_bp = Blueprint('reports', __name__)
 
+# Rows fetched from the cursor and encoded per streamed chunk
+STREAM_BATCH_SIZE = 1000
+
+def stock_level_row(row):
+    return {
+        'product_id': row.id,
+        'product_name': row.name,
+        'sku': row.sku,
+        'category_id': row.category_id,
+        'warehouse_id': row.warehouse_id,
+        'warehouse_name': row.warehouse_name,
+        'quantity': row.quantity,
+        'reorder_level': row.reorder_level,
+        'max_stock_level': row.max_stock_level,
+        'is_low_stock': bool(row.is_low_stock),
+        'stock_percentage': round((row.quantity / row.max_stock_level) * 100, 2) if row.max_stock_level > 0 else 0
+    }
+
 @reports_bp.route('/dashboard', methods=['GET'])
+@cached_response('dashboard', ttl=30)
 def get_dashboard_summary():
     """Get dashboard summary statistics"""
     try:
-        # Total products
-        total_products = Product.query.filter_by(is_active=True).count()
-        
-        # Total warehouses
-        total_warehouses = Warehouse.query.filter_by(is_active=True).count()
-        
-        # Low stock items count
-        low_stock_count = db.session.query(Inventory).filter(
-            Inventory.quantity <= Inventory.reorder_level
-        ).count()
-        
-        # Pending purchase orders
-        pending_pos = PurchaseOrder.query.filter_by(status='pending').count()
-        
-        # Total inventory value (approximation using unit_price)
-        inventory_value = db.session.query(
-            func.sum(Inventory.quantity * Product.unit_price)
-        ).join(Product).filter(Product.unit_price.isnot(None)).scalar() or 0
-        
-        # Recent stock movements (last 7 days)
         seven_days_ago = datetime.utcnow() - timedelta(days=7)
-        recent_movements = StockMovement.query.filter(
-            StockMovement.created_at >= seven_days_ago
-        ).count()
+        
+        # Every figure is a scalar subquery of one SELECT, so the dashboard costs a single round trip
+        summary = db.session.execute(select(
+            # Total products
+            select(func.count(Product.id)).where(Product.is_active == true())
+            .scalar_subquery().label('total_products'),
+            # Total warehouses
+            select(func.count(Warehouse.id)).where(Warehouse.is_active == true())
+            .scalar_subquery().label('total_warehouses'),
+            # Low stock items count
+            select(func.count(Inventory.id)).where(Inventory.is_low_stock == true())
+            .scalar_subquery().label('low_stock_items'),
+            # Pending purchase orders
+            select(func.count(PurchaseOrder.id)).where(PurchaseOrder.status == 'pending')
+            .scalar_subquery().label('pending_purchase_orders'),
+            # Total inventory value (approximation using unit_price)
+            select(func.sum(Inventory.quantity * Product.unit_price))
+            .join(Product, Product.id == Inventory.product_id)
+            .where(Product.unit_price.isnot(None))
+            .scalar_subquery().label('total_inventory_value'),
+            # Recent stock movements (last 7 days)
+            select(func.count(StockMovement.id)).where(StockMovement.created_at >= seven_days_ago)
+            .scalar_subquery().label('recent_movements')
+        )).one()
+        
+        data = summary._asdict()
+        data['total_inventory_value'] = float(data['total_inventory_value'] or 0)
         
         return jsonify({
             'success': True,
-            'data': {
-                'total_products': total_products,
-                'total_warehouses': total_warehouses,
-                'low_stock_items': low_stock_count,
-                'pending_purchase_orders': pending_pos,
-                'total_inventory_value': float(inventory_value),
-                'recent_movements': recent_movements
-            }
+            'data': data
         })
         
     except Exception as e:
@@ -54,36 +72,40 @@ def get_inventory_turnover():
     """Get inventory turnover analysis"""
     try:
         days = request.args.get('days', 30, type=int)
+        limit = max(min(request.args.get('limit', 100, type=int), 1000), 1)
         start_date = datetime.utcnow() - timedelta(days=days)
         
-        # Get products with movement data
+        total_movement = func.sum(StockMovement.quantity)
+        avg_inventory = func.avg(Inventory.quantity)
+        
+        # Get products with movement data, ranked by turnover in SQL
         turnover_data = db.session.query(
             Product.id,
             Product.name,
             Product.sku,
-            func.sum(StockMovement.quantity).label('total_movement'),
-            func.avg(Inventory.quantity).label('avg_inventory')
+            total_movement.label('total_movement'),
+            avg_inventory.label('avg_inventory'),
+            func.coalesce(total_movement / func.nullif(avg_inventory, 0), 0).label('turnover_rate')
         ).join(StockMovement, Product.id == StockMovement.product_id)\
          .join(Inventory, Product.id == Inventory.product_id)\
          .filter(StockMovement.created_at >= start_date)\
          .filter(StockMovement.movement_type == 'out')\
          .group_by(Product.id, Product.name, Product.sku)\
+         .order_by(desc('turnover_rate'))\
+         .limit(limit)\
          .all()
         
-        results = []
-        for row in turnover_data:
-            turnover_rate = (row.total_movement / row.avg_inventory) if row.avg_inventory > 0 else 0
-            results.append({
+        results = [
+            {
                 'product_id': row.id,
                 'product_name': row.name,
                 'sku': row.sku,
                 'total_movement': int(row.total_movement),
                 'avg_inventory': float(row.avg_inventory),
-                'turnover_rate': round(turnover_rate, 2)
-            })
-        
-        # Sort by turnover rate
-        results.sort(key=lambda x: x['turnover_rate'], reverse=True)
+                'turnover_rate': round(float(row.turnover_rate), 2)
+            }
+            for row in turnover_data
+        ]
         
         return jsonify({
             'success': True,
@@ -112,7 +134,7 @@ def get_stock_levels_report():
             Inventory.quantity,
             Inventory.reorder_level,
             Inventory.max_stock_level,
-            (Inventory.quantity <= Inventory.reorder_level).label('is_low_stock')
+            Inventory.is_low_stock
         ).join(Inventory, Product.id == Inventory.product_id)\
          .join(Warehouse, Inventory.warehouse_id == Warehouse.id)
         
@@ -122,29 +144,13 @@ def get_stock_levels_report():
         if category_id:
             query = query.filter(Product.category_id == category_id)
         
-        stock_levels = query.all()
-        
-        results = []
-        for row in stock_levels:
-            results.append({
-                'product_id': row.id,
-                'product_name': row.name,
-                'sku': row.sku,
-                'category_id': row.category_id,
-                'warehouse_id': row.warehouse_id,
-                'warehouse_name': row.warehouse_name,
-                'quantity': row.quantity,
-                'reorder_level': row.reorder_level,
-                'max_stock_level': row.max_stock_level,
-                'is_low_stock': bool(row.is_low_stock),
-                'stock_percentage': round((row.quantity / row.max_stock_level) * 100, 2) if row.max_stock_level > 0 else 0
-            })
+        # Stream rows from a server-side cursor so memory stays bounded by the batch size
+        result = db.session.execute(query.statement, execution_options={'yield_per': STREAM_BATCH_SIZE})
         
-        return jsonify({
-            'success': True,
-            'data': results,
-            'count': len(results)
-        })
+        return Response(
+            stream_with_context(stream_json_rows(result, stock_level_row)),
+            mimetype='application/json'
+        )
         
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -168,19 +174,23 @@ def get_stock_valuation():
          .join(Warehouse, Inventory.warehouse_id == Warehouse.id)\
          .filter(Product.unit_price.isnot(None))
         
+        # Group by warehouse in SQL: one row per warehouse instead of summing item dicts
+        totals_query = db.session.query(
+            Warehouse.id,
+            Warehouse.name,
+            func.sum(Inventory.quantity * Product.unit_price).label('total_value'),
+            func.count(Inventory.id).label('item_count')
+        ).join(Inventory, Inventory.warehouse_id == Warehouse.id)\
+         .join(Product, Product.id == Inventory.product_id)\
+         .filter(Product.unit_price.isnot(None))\
+         .group_by(Warehouse.id, Warehouse.name)
+        
         if warehouse_id:
             query = query.filter(Warehouse.id == warehouse_id)
+            totals_query = totals_query.filter(Warehouse.id == warehouse_id)
         
-        valuation_data = query.all()
-        
-        results = []
-        total_valuation = 0
-        
-        for row in valuation_data:
-            value = float(row.total_value) if row.total_value else 0
-            total_valuation += value
-            
-            results.append({
+        results = [
+            {
                 'product_id': row.id,
                 'product_name': row.name,
                 'sku': row.sku,
@@ -188,28 +198,26 @@ def get_stock_valuation():
                 'warehouse_id': row.warehouse_id,
                 'warehouse_name': row.warehouse_name,
                 'quantity': row.quantity,
-                'total_value': value
-            })
-        
-        # Group by warehouse
-        warehouse_totals = {}
-        for item in results:
-            wh_id = item['warehouse_id']
-            if wh_id not in warehouse_totals:
-                warehouse_totals[wh_id] = {
-                    'warehouse_name': item['warehouse_name'],
-                    'total_value': 0,
-                    'item_count': 0
-                }
-            warehouse_totals[wh_id]['total_value'] += item['total_value']
-            warehouse_totals[wh_id]['item_count'] += 1
+                'total_value': float(row.total_value) if row.total_value else 0
+            }
+            for row in query
+        ]
+        
+        warehouse_totals = {
+            row.id: {
+                'warehouse_name': row.name,
+                'total_value': float(row.total_value or 0),
+                'item_count': row.item_count
+            }
+            for row in totals_query
+        }
         
         return jsonify({
             'success': True,
             'data': {
                 'items': results,
                 'warehouse_totals': warehouse_totals,
-                'grand_total': round(total_valuation, 2)
+                'grand_total': round(sum(total['total_value'] for total in warehouse_totals.values()), 2)
             },
             'count': len(results)
         })
@@ -225,6 +233,8 @@ def get_movement_history():
         product_id = request.args.get('product_id', type=int)
         warehouse_id = request.args.get('warehouse_id', type=int)
         movement_type = request.args.get('movement_type')
+        limit = max(min(request.args.get('limit', 1000, type=int), 5000), 1)
+        after_id = request.args.get('after_id', type=int)
         
         start_date = datetime.utcnow() - timedelta(days=days)
         
@@ -252,34 +262,39 @@ def get_movement_history():
         if movement_type:
             query = query.filter(StockMovement.movement_type == movement_type)
         
-        movements = query.order_by(desc(StockMovement.created_at)).all()
-        
-        results = []
-        for movement in movements:
-            results.append({
-                'id': movement.id,
-                'movement_type': movement.movement_type,
-                'quantity': movement.quantity,
-                'reference_type': movement.reference_type,
-                'reference_id': movement.reference_id,
-                'notes': movement.notes,
-                'created_at': movement.created_at.isoformat(),
-                'product_name': movement.product_name,
-                'sku': movement.sku,
-                'warehouse_name': movement.warehouse_name
-            })
+        # Keyset pagination: seek past the (created_at, id) of the last movement seen
+        if after_id is not None:
+            after_created_at = (
+                select(StockMovement.created_at).where(StockMovement.id == after_id).scalar_subquery()
+            )
+            query = query.filter(or_(
+                StockMovement.created_at < after_created_at,
+                and_(StockMovement.created_at == after_created_at, StockMovement.id < after_id)
+            ))
+        
+        # Fetch one extra row to learn whether another page follows, without a COUNT(*)
+        movements = query.order_by(desc(StockMovement.created_at), desc(StockMovement.id)).limit(limit + 1).all()
+        has_more = len(movements) > limit
+        movements = movements[:limit]
+        
+        # Selected labels match the response keys; orjson encodes created_at natively
+        results = [movement._asdict() for movement in movements]
         
         return jsonify({
             'success': True,
             'data': results,
             'period_days': days,
-            'count': len(results)
+            'count': len(results),
+            'has_more': has_more,
+            'next_after_id': results[-1]['id'] if has_more else None
         })
         
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @reports_bp.route('/purchase-order-summary', methods=['GET'])
+@conditional_response(max_age=60)
+@cached_response('purchase_orders')
 def get_purchase_order_summary():
     """Get purchase order summary report"""
     try:
@@ -1,14 +1,43 @@
 from flask import Blueprint, request, jsonify
-from models import db, Supplier
+from models import db, Supplier, PurchaseOrder
+from routes.products import FULLTEXT_MIN_WORD
+from routes.query_args import parse_bool
+from services.cache import cached_response, invalidate_tags
+from sqlalchemy import exists, or_, select
+from sqlalchemy.dialects.mysql import match
 from sqlalchemy.exc import IntegrityError
+import re
 
 suppliers_bp = Blueprint('suppliers', __name__)
 
+# Fields a PUT may change
+SUPPLIER_UPDATABLE_FIELDS = frozenset((
+    'name', 'contact_person', 'email', 'phone', 'address',
+    'tax_id', 'payment_terms', 'is_active'
+))
+
+def supplier_search_filter(search):
+    """Build the search predicate, using the FULLTEXT index on MySQL when the terms allow it"""
+    words = re.findall(r'\w+', search)
+    
+    if db.session.get_bind().dialect.name == 'mysql' and words and all(len(word) >= FULLTEXT_MIN_WORD for word in words):
+        return match(
+            Supplier.name, Supplier.contact_person, Supplier.email,
+            against=' '.join(f'+{word}*' for word in words)
+        ).in_boolean_mode()
+    
+    return or_(
+        Supplier.name.contains(search),
+        Supplier.contact_person.contains(search),
+        Supplier.email.contains(search)
+    )
+
 @suppliers_bp.route('', methods=['GET'])
+@cached_response('suppliers')
 def get_suppliers():
     """Get all suppliers with optional filtering"""
     try:
-        is_active = request.args.get('is_active', type=bool)
+        is_active = request.args.get('is_active', type=parse_bool)
         search = request.args.get('search', '')
         
         query = Supplier.query
@@ -17,13 +46,7 @@ def get_suppliers():
             query = query.filter_by(is_active=is_active)
         
         if search:
-            query = query.filter(
-                db.or_(
-                    Supplier.name.contains(search),
-                    Supplier.contact_person.contains(search),
-                    Supplier.email.contains(search)
-                )
-            )
+            query = query.filter(supplier_search_filter(search))
         
         suppliers = query.all()
         
@@ -69,6 +92,7 @@ def create_supplier():
         
         db.session.add(supplier)
         db.session.commit()
+        invalidate_tags('suppliers')
         
         return jsonify({
             'success': True,
@@ -91,14 +115,12 @@ def update_supplier(supplier_id):
             return jsonify({'success': False, 'error': 'No data provided'}), 400
         
         # Update fields
-        updatable_fields = ['name', 'contact_person', 'email', 'phone', 
-                           'address', 'tax_id', 'payment_terms', 'is_active']
-        
-        for field in updatable_fields:
-            if field in data:
-                setattr(supplier, field, data[field])
+        for field in data.keys() & SUPPLIER_UPDATABLE_FIELDS:
+            setattr(supplier, field, data[field])
         
         db.session.commit()
+        # Purchase order listings carry the supplier name
+        invalidate_tags('suppliers', 'purchase_orders')
         
         return jsonify({
             'success': True,
@@ -116,8 +138,8 @@ def delete_supplier(supplier_id):
     try:
         supplier = Supplier.query.get_or_404(supplier_id)
         
-        # Check if supplier has purchase orders
-        if supplier.purchase_orders:
+        # Check if supplier has purchase orders without loading them
+        if db.session.scalar(select(exists().where(PurchaseOrder.supplier_id == supplier_id))):
             return jsonify({
                 'success': False, 
                 'error': 'Cannot delete supplier with existing purchase orders'
@@ -125,6 +147,7 @@ def delete_supplier(supplier_id):
         
         db.session.delete(supplier)
         db.session.commit()
+        invalidate_tags('suppliers')
         
         return jsonify({
             'success': True,
@@ -1,18 +1,70 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models import db, User, Role
+from routes.query_args import parse_bool
+from routes.auth import get_current_user, reset_default_role_cache
+from routes.products import FULLTEXT_MIN_WORD
+from services.cache import cached_response, invalidate_tags
+from sqlalchemy import select, exists, false
+from sqlalchemy.dialects.mysql import match
+from sqlalchemy.orm import joinedload, raiseload
 from functools import wraps
+import re
+import time
 
 users_bp = Blueprint('users', __name__)
 
+# Fields an admin PUT may change; username and email are checked for clashes first
+USER_UPDATABLE_FIELDS = frozenset(('username', 'email', 'first_name', 'last_name', 'role_id', 'is_active'))
+
+# Seconds an admin check is reused before the user's role is read again
+ADMIN_CHECK_TTL = 30
+ADMIN_CHECK_MAX_ENTRIES = 4096
+
+# user id -> (is admin, monotonic expiry); per process, cleared by user and role changes
+_admin_checks = {}
+
+def is_admin(user_id):
+    """Return whether the user holds the Admin role, reusing a recent answer"""
+    now = time.monotonic()
+    cached = _admin_checks.get(user_id)
+    if cached is not None and cached[1] > now:
+        return cached[0]
+    
+    user = get_current_user()
+    allowed = bool(user and user.role and user.role.name == 'Admin')
+    
+    if len(_admin_checks) >= ADMIN_CHECK_MAX_ENTRIES:
+        _admin_checks.clear()
+    _admin_checks[user_id] = (allowed, now + ADMIN_CHECK_TTL)
+    return allowed
+
+def reset_admin_checks():
+    """Forget cached admin checks (call after users or roles are modified)"""
+    _admin_checks.clear()
+
+def user_search_filter(search):
+    """Build the search predicate, using the FULLTEXT index on MySQL when the terms allow it"""
+    words = re.findall(r'\w+', search)
+    
+    if db.session.get_bind().dialect.name == 'mysql' and words and all(len(word) >= FULLTEXT_MIN_WORD for word in words):
+        return match(
+            User.username, User.email, User.first_name, User.last_name,
+            against=' '.join(f'+{word}*' for word in words)
+        ).in_boolean_mode()
+    
+    return db.or_(
+        User.username.contains(search),
+        User.email.contains(search),
+        User.first_name.contains(search),
+        User.last_name.contains(search)
+    )
+
 def admin_required(f):
     """Decorator to require admin role"""
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        current_user_id = int(get_jwt_identity())
-        user = User.query.get(current_user_id)
-        
-        if not user or not user.role or user.role.name != 'Admin':
+        if not is_admin(get_jwt_identity()):
             return jsonify({'success': False, 'error': 'Admin access required'}), 403
         
         return f(*args, **kwargs)
@@ -26,19 +78,15 @@ def get_users():
     try:
         search = request.args.get('search', '')
         role_id = request.args.get('role_id', type=int)
-        is_active = request.args.get('is_active', type=bool)
+        is_active = request.args.get('is_active', type=parse_bool)
+        page = request.args.get('page', 1, type=int)
+        per_page = min(request.args.get('per_page', 50, type=int), 200)
         
-        query = User.query
+        # to_dict reads the role name, so load roles in the same SELECT
+        query = User.query.options(joinedload(User.role), raiseload('*'))
         
         if search:
-            query = query.filter(
-                db.or_(
-                    User.username.contains(search),
-                    User.email.contains(search),
-                    User.first_name.contains(search),
-                    User.last_name.contains(search)
-                )
-            )
+            query = query.filter(user_search_filter(search))
         
         if role_id:
             query = query.filter_by(role_id=role_id)
@@ -46,12 +94,21 @@ def get_users():
         if is_active is not None:
             query = query.filter_by(is_active=is_active)
         
-        users = query.all()
+        # Paginate results
+        users = query.order_by(User.id).paginate(page=page, per_page=per_page, error_out=False)
         
         return jsonify({
             'success': True,
-            'data': [user.to_dict() for user in users],
-            'count': len(users)
+            'data': [user.to_dict() for user in users.items],
+            'count': users.total,
+            'pagination': {
+                'page': page,
+                'per_page': per_page,
+                'total': users.total,
+                'pages': users.pages,
+                'has_next': users.has_next,
+                'has_prev': users.has_prev
+            }
         })
         
     except Exception as e:
@@ -88,11 +145,16 @@ def create_user():
             if not data.get(field):
                 return jsonify({'success': False, 'error': f'{field} is required'}), 400
         
-        # Check if username or email already exists
-        if User.query.filter_by(username=data['username']).first():
+        # Check if username or email already exists (both EXISTS probes in one round trip)
+        username_taken, email_taken = db.session.execute(select(
+            exists().where(User.username == data['username']),
+            exists().where(User.email == data['email'])
+        )).one()
+        
+        if username_taken:
             return jsonify({'success': False, 'error': 'Username already exists'}), 409
         
-        if User.query.filter_by(email=data['email']).first():
+        if email_taken:
             return jsonify({'success': False, 'error': 'Email already exists'}), 409
         
         # Verify role exists
@@ -136,31 +198,35 @@ def update_user(user_id):
         if not data:
             return jsonify({'success': False, 'error': 'No data provided'}), 400
         
-        # Update allowed fields
-        updatable_fields = ['username', 'email', 'first_name', 'last_name', 'role_id', 'is_active']
+        # Check a changed username and email for clashes in one round trip
+        username_changed = 'username' in data and data['username'] != user.username
+        email_changed = 'email' in data and data['email'] != user.email
+        
+        if username_changed or email_changed:
+            username_taken, email_taken = db.session.execute(select(
+                exists().where(User.username == data['username']) if username_changed else false(),
+                exists().where(User.email == data['email']) if email_changed else false()
+            )).one()
+            
+            if username_taken:
+                return jsonify({'success': False, 'error': 'Username already exists'}), 409
+            
+            if email_taken:
+                return jsonify({'success': False, 'error': 'Email already exists'}), 409
+        
+        if 'role_id' in data and not db.session.get(Role, data['role_id']):
+            return jsonify({'success': False, 'error': 'Role not found'}), 404
         
-        for field in updatable_fields:
-            if field in data:
-                if field == 'username' and data[field] != user.username:
-                    if User.query.filter_by(username=data[field]).first():
-                        return jsonify({'success': False, 'error': 'Username already exists'}), 409
-                
-                if field == 'email' and data[field] != user.email:
-                    if User.query.filter_by(email=data[field]).first():
-                        return jsonify({'success': False, 'error': 'Email already exists'}), 409
-                
-                if field == 'role_id':
-                    role = Role.query.get(data[field])
-                    if not role:
-                        return jsonify({'success': False, 'error': 'Role not found'}), 404
-                
-                setattr(user, field, data[field])
+        # Update allowed fields
+        for field in data.keys() & USER_UPDATABLE_FIELDS:
+            setattr(user, field, data[field])
         
         # Update password if provided
         if 'password' in data and data['password']:
             user.set_password(data['password'])
         
         db.session.commit()
+        reset_admin_checks()
         
         return jsonify({
             'success': True,
@@ -178,7 +244,7 @@ def update_user(user_id):
 def delete_user(user_id):
     """Delete user (admin only)"""
     try:
-        current_user_id = int(get_jwt_identity())
+        current_user_id = get_jwt_identity()
         
         # Prevent admin from deleting themselves
         if user_id == current_user_id:
@@ -188,6 +254,7 @@ def delete_user(user_id):
         
         db.session.delete(user)
         db.session.commit()
+        reset_admin_checks()
         
         return jsonify({
             'success': True,
@@ -200,6 +267,7 @@ def delete_user(user_id):
 
 @users_bp.route('/roles', methods=['GET'])
 @jwt_required()
+@cached_response('roles', ttl=300)
 def get_roles():
     """Get all roles"""
     try:
@@ -224,7 +292,7 @@ def create_role():
             return jsonify({'success': False, 'error': 'Role name is required'}), 400
         
         # Check if role already exists
-        if Role.query.filter_by(name=data['name']).first():
+        if db.session.scalar(select(exists().where(Role.name == data['name']))):
             return jsonify({'success': False, 'error': 'Role already exists'}), 409
         
         role = Role(
@@ -235,6 +303,7 @@ def create_role():
         
         db.session.add(role)
         db.session.commit()
+        invalidate_tags('roles')
         
         return jsonify({
             'success': True,
@@ -264,12 +333,15 @@ def update_role(role_id):
         for field in updatable_fields:
             if field in data:
                 if field == 'name' and data[field] != role.name:
-                    if Role.query.filter_by(name=data[field]).first():
+                    if db.session.scalar(select(exists().where(Role.name == data[field]))):
                         return jsonify({'success': False, 'error': 'Role name already exists'}), 409
                 
                 setattr(role, field, data[field])
         
         db.session.commit()
+        reset_default_role_cache()
+        reset_admin_checks()
+        invalidate_tags('roles')
         
         return jsonify({
             'success': True,
@@ -1,16 +1,23 @@
 from flask import Blueprint, request, jsonify
-from models import db, Warehouse
+from models import db, Warehouse, Inventory
+from services.cache import invalidate_tags
+from routes.query_args import parse_bool
+from sqlalchemy import exists, select
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import raiseload, selectinload
 
 warehouses_bp = Blueprint('warehouses', __name__)
 
+# Fields a PUT may change
+WAREHOUSE_UPDATABLE_FIELDS = frozenset(('name', 'location', 'address', 'contact_info', 'is_active'))
+
 @warehouses_bp.route('', methods=['GET'])
 def get_warehouses():
     """Get all warehouses"""
     try:
-        is_active = request.args.get('is_active', type=bool)
+        is_active = request.args.get('is_active', type=parse_bool)
         
-        query = Warehouse.query
+        query = Warehouse.query.options(raiseload('*'))
         if is_active is not None:
             query = query.filter_by(is_active=is_active)
         
@@ -77,13 +84,11 @@ def update_warehouse(warehouse_id):
             return jsonify({'success': False, 'error': 'No data provided'}), 400
         
         # Update fields
-        updatable_fields = ['name', 'location', 'address', 'contact_info', 'is_active']
-        
-        for field in updatable_fields:
-            if field in data:
-                setattr(warehouse, field, data[field])
+        for field in data.keys() & WAREHOUSE_UPDATABLE_FIELDS:
+            setattr(warehouse, field, data[field])
         
         db.session.commit()
+        invalidate_tags('inventory')
         
         return jsonify({
             'success': True,
@@ -101,8 +106,8 @@ def delete_warehouse(warehouse_id):
     try:
         warehouse = Warehouse.query.get_or_404(warehouse_id)
         
-        # Check if warehouse has inventory
-        if warehouse.inventory_items:
+        # Check if warehouse has inventory without loading it
+        if db.session.scalar(select(exists().where(Inventory.warehouse_id == warehouse_id))):
             return jsonify({
                 'success': False, 
                 'error': 'Cannot delete warehouse with existing inventory'
@@ -110,6 +115,7 @@ def delete_warehouse(warehouse_id):
         
         db.session.delete(warehouse)
         db.session.commit()
+        invalidate_tags('inventory')
         
         return jsonify({
             'success': True,
@@ -124,7 +130,11 @@ def delete_warehouse(warehouse_id):
 def get_warehouse_inventory(warehouse_id):
     """Get inventory for a specific warehouse"""
     try:
-        warehouse = Warehouse.query.get_or_404(warehouse_id)
+        # to_dict reads each item's product and its (already loaded) warehouse; any other lazy load raises
+        warehouse = Warehouse.query.options(
+            selectinload(Warehouse.inventory_items).joinedload(Inventory.product),
+            raiseload('*', sql_only=True)
+        ).get_or_404(warehouse_id)
         
         return jsonify({
             'success': True,
@@ -0,0 +1,65 @@
+"""
+Default seed data shared by the database setup scripts.
+"""
+
+from models import Role
+
+DEFAULT_ROLE_PERMISSIONS = {
+    "Admin": {
+        "products": ["create", "read", "update", "delete"],
+        "inventory": ["create", "read", "update", "delete"],
+        "warehouses": ["create", "read", "update", "delete"],
+        "suppliers": ["create", "read", "update", "delete"],
+        "purchase_orders": ["create", "read", "update", "delete"],
+        "reports": ["read"],
+        "users": ["create", "read", "update", "delete"],
+        "system": ["backup", "restore", "settings"]
+    },
+    "User": {
+        "products": ["read"],
+        "inventory": ["read", "update"],
+        "warehouses": ["read"],
+        "suppliers": ["read"],
+        "purchase_orders": ["create", "read"],
+        "reports": ["read"]
+    },
+    "Manager": {
+        "products": ["create", "read", "update", "delete"],
+        "inventory": ["create", "read", "update", "delete"],
+        "warehouses": ["create", "read", "update"],
+        "suppliers": ["create", "read", "update", "delete"],
+        "purchase_orders": ["create", "read", "update", "delete"],
+        "reports": ["read"]
+    }
+}
+
+DEFAULT_ROLES = [
+    {
+        'name': "Admin",
+        'description': "Full system access with all permissions",
+        'permissions': DEFAULT_ROLE_PERMISSIONS["Admin"]
+    },
+    {
+        'name': "User",
+        'description': "Standard user access with limited permissions",
+        'permissions': DEFAULT_ROLE_PERMISSIONS["User"]
+    },
+    {
+        'name': "Manager",
+        'description': "Manager access with most permissions except user management",
+        'permissions': DEFAULT_ROLE_PERMISSIONS["Manager"]
+    }
+]
+
+def ensure_roles(session, commit=True):
+    """Create any missing default roles and return the names that were created"""
+    role_names = [role['name'] for role in DEFAULT_ROLES]
+    existing = {name for (name,) in session.query(Role.name).filter(Role.name.in_(role_names)).all()}
+
+    missing = [Role(**role) for role in DEFAULT_ROLES if role['name'] not in existing]
+    if missing:
+        session.bulk_save_objects(missing)
+        if commit:
+            session.commit()
+
+    return [role.name for role in missing]
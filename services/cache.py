@@ -0,0 +1,125 @@
+from flask import current_app, request, Response
+from functools import wraps
+import hashlib
+import redis
+
+# Shared client, created on first use from REDIS_URL
+_client = None
+
+def get_redis():
+    """Return the shared Redis client, or None when caching is not configured"""
+    global _client
+    
+    if _client is None:
+        url = current_app.config.get('REDIS_URL')
+        if not url:
+            return None
+        _client = redis.Redis.from_url(url, socket_timeout=0.5)
+    return _client
+
+def cache_get(key):
+    """Return the cached JSON value for key, or None on a miss"""
+    client = get_redis()
+    if client is None:
+        return None
+    
+    try:
+        raw = client.get(key)
+    except redis.RedisError as e:
+        current_app.logger.warning(f"Cache read failed for {key}: {str(e)}")
+        return None
+    
+    return current_app.json.loads(raw) if raw is not None else None
+
+def cache_set(key, value, ttl):
+    """Store value as JSON under key for ttl seconds"""
+    client = get_redis()
+    if client is None:
+        return
+    
+    try:
+        client.set(key, current_app.json.dumps(value), ex=ttl)
+    except redis.RedisError as e:
+        current_app.logger.warning(f"Cache write failed for {key}: {str(e)}")
+
+def cache_delete(*keys):
+    """Drop the given keys from the cache"""
+    client = get_redis()
+    if client is None or not keys:
+        return
+    
+    try:
+        client.delete(*keys)
+    except redis.RedisError as e:
+        current_app.logger.warning(f"Cache delete failed for {', '.join(keys)}: {str(e)}")
+
+def tag_set_key(tag):
+    return f"tag:{tag}"
+
+def cached_response(tag, ttl=60):
+    """Cache a GET view's successful JSON response per path and query string, grouped under tag"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            client = get_redis()
+            if client is None:
+                return view(*args, **kwargs)
+            
+            query = '&'.join(f"{k}={v}" for k, v in sorted(request.args.items(multi=True)))
+            key = f"{tag}:{hashlib.sha1(f'{request.path}?{query}'.encode()).hexdigest()}"
+            
+            try:
+                raw = client.get(key)
+            except redis.RedisError as e:
+                current_app.logger.warning(f"Cache read failed for {key}: {str(e)}")
+                raw = None
+            
+            if raw is not None:
+                return Response(raw, mimetype='application/json')
+            
+            response = view(*args, **kwargs)
+            
+            if isinstance(response, Response) and response.status_code == 200:
+                try:
+                    # Track the key under its tag so writes can drop every cached variant
+                    with client.pipeline() as pipe:
+                        pipe.set(key, response.get_data(), ex=ttl)
+                        pipe.sadd(tag_set_key(tag), key)
+                        pipe.expire(tag_set_key(tag), ttl)
+                        pipe.execute()
+                except redis.RedisError as e:
+                    current_app.logger.warning(f"Cache write failed for {key}: {str(e)}")
+            
+            return response
+        return wrapper
+    return decorator
+
+def conditional_response(max_age=60):
+    """Give a GET view's successful response an ETag and max-age, answering 304 when the client's copy matches"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            response = view(*args, **kwargs)
+            
+            if isinstance(response, Response) and response.status_code == 200:
+                response.add_etag()
+                response.cache_control.private = True
+                response.cache_control.max_age = max_age
+                return response.make_conditional(request)
+            
+            return response
+        return wrapper
+    return decorator
+
+def invalidate_tags(*tags):
+    """Drop every cached response stored under the given tags"""
+    client = get_redis()
+    if client is None:
+        return
+    
+    for tag in tags:
+        try:
+            keys = client.smembers(tag_set_key(tag))
+            client.delete(tag_set_key(tag), *keys)
+        except redis.RedisError as e:
+            current_app.logger.warning(f"Cache invalidation failed for {tag}: {str(e)}")
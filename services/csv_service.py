@@ -1,41 +1,131 @@
-import pandas as pd
+import csv
 import io
 import os
 from flask import current_app
-from models import db, Product, Category, Warehouse, Inventory, Supplier
-from datetime import datetime
+from models import db, Product, Category, Warehouse, Inventory, Supplier, run_blocking
+from services.inventory_service import inventory_upsert
+from sqlalchemy import select, insert, update, func
+
+# pandas is imported inside each method so it stays off the app import path
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+def _to_int(series):
+    """Cast a column to nullable integers; cells that are not whole numbers become <NA>"""
+    import pandas as pd
+    
+    values = pd.to_numeric(series, errors='coerce')
+    return values.where(values % 1 == 0).astype('Int64')
+
+def _invalid_cells(df, casts, required=()):
+    """Cast columns in place; return a boolean frame of cells that did not parse or are empty but required"""
+    import pandas as pd
+    
+    invalid = {}
+    for column, cast in casts.items():
+        if column not in df.columns:
+            continue
+        values = cast(df[column])
+        invalid[column] = values.isna() if column in required else values.isna() & df[column].notna()
+        df[column] = values
+    return pd.DataFrame(invalid, index=df.index, dtype=bool)
+
+def _row_error(invalid, index):
+    """Describe the failed cells of one row"""
+    return f"Row {index + 1}: Invalid or missing {', '.join(invalid.columns[invalid.iloc[index]])}"
+
+def _records(df):
+    """Return the frame's rows as plain dicts with empty cells as None"""
+    return df.astype(object).where(df.notna(), None).to_dict('records')
+
+def _parse_products(csv_file):
+    """Read and cast a products CSV; pandas only (no database or network), so it can run on a native thread"""
+    import pandas as pd
+    
+    # Parse straight from the upload stream; keep SKUs as text (e.g. leading zeros)
+    df = pd.read_csv(csv_file, dtype={'sku': str})
+    
+    # Validate required columns
+    missing_columns = [col for col in ('name', 'sku') if col not in df.columns]
+    if missing_columns:
+        return None, f"Missing required columns: {', '.join(missing_columns)}"
+    
+    # Cast the typed columns once; rows with cells that fail are reported instead of imported
+    invalid = _invalid_cells(df, {
+        'category_id': _to_int,
+        'unit_price': lambda column: pd.to_numeric(column, errors='coerce')
+    })
+    if 'is_active' in df.columns:
+        df['is_active'] = df['is_active'].fillna(True).astype(bool)
+    
+    return (df, _records(df), invalid, invalid.any(axis=1).tolist()), None
+
+def _parse_inventory(csv_file):
+    """Read and cast an inventory CSV; pandas only (no database or network), so it can run on a native thread"""
+    import pandas as pd
+    
+    # Parse straight from the upload stream
+    df = pd.read_csv(csv_file)
+    
+    # Validate required columns
+    required_columns = ['product_id', 'warehouse_id', 'quantity']
+    missing_columns = [col for col in required_columns if col not in df.columns]
+    if missing_columns:
+        return None, f"Missing required columns: {', '.join(missing_columns)}"
+    
+    # Cast the numeric columns once; rows with cells that fail are reported instead of imported
+    invalid = _invalid_cells(
+        df,
+        dict.fromkeys(('product_id', 'warehouse_id', 'quantity', 'reorder_level', 'max_stock_level'), _to_int),
+        required=required_columns
+    )
+    
+    return (df, _records(df), invalid, invalid.any(axis=1).tolist()), None
+
+# Rows fetched from the cursor and written per streamed chunk
+EXPORT_BATCH_SIZE = 1000
+
+def _stream_csv(header, result, convert_row):
+    """Yield CSV text for the header, then one chunk per batch of result rows"""
+    output = io.StringIO()
+    writer = csv.writer(output, lineterminator='\n')
+    
+    writer.writerow(header)
+    yield output.getvalue()
+    
+    for partition in result.partitions():
+        output.seek(0)
+        output.truncate()
+        writer.writerows(map(convert_row, partition))
+        yield output.getvalue()
+    
+    output.close()
 
 class CSVService:
     
     @staticmethod
     def export_products():
-        """Export products to CSV format"""
+        """Export products as a generator of CSV chunks"""
         try:
-            products = Product.query.all()
+            # Select only the exported columns, with the category name joined in
+            result = db.session.execute(
+                select(
+                    Product.id, Product.name, Product.description, Product.sku, Product.barcode,
+                    Product.category_id, func.coalesce(Category.name, ''), Product.unit_price,
+                    Product.is_active, Product.created_at, Product.specifications
+                )
+                .outerjoin(Category, Product.category_id == Category.id)
+                .order_by(Product.id),
+                execution_options={'yield_per': EXPORT_BATCH_SIZE}
+            )
             
-            data = []
-            for product in products:
-                data.append({
-                    'id': product.id,
-                    'name': product.name,
-                    'description': product.description,
-                    'sku': product.sku,
-                    'barcode': product.barcode,
-                    'category_id': product.category_id,
-                    'category_name': product.category.name if product.category else '',
-                    'unit_price': float(product.unit_price) if product.unit_price else None,
-                    'is_active': product.is_active,
-                    'created_at': product.created_at.isoformat() if product.created_at else None,
-                    'specifications': str(product.specifications) if product.specifications else ''
-                })
-            
-            df = pd.DataFrame(data)
-            
-            # Convert to CSV
-            output = io.StringIO()
-            df.to_csv(output, index=False)
-            csv_content = output.getvalue()
-            output.close()
+            csv_content = _stream_csv(
+                ['id', 'name', 'description', 'sku', 'barcode', 'category_id', 'category_name',
+                 'unit_price', 'is_active', 'created_at', 'specifications'],
+                result,
+                lambda row: (*row[:9], _isoformat(row.created_at), str(row.specifications) if row.specifications else '')
+            )
             
             return csv_content, None
             
@@ -44,17 +134,14 @@ class CSVService:
             return None, str(e)
     
     @staticmethod
-    def import_products(csv_content, update_existing=False):
-        """Import products from CSV content"""
+    def import_products(csv_file, update_existing=False):
+        """Import products from an uploaded CSV file stream"""
         try:
-            # Read CSV content
-            df = pd.read_csv(io.StringIO(csv_content))
-            
-            # Validate required columns
-            required_columns = ['name', 'sku']
-            missing_columns = [col for col in required_columns if col not in df.columns]
-            if missing_columns:
-                return None, f"Missing required columns: {', '.join(missing_columns)}"
+            # The CPU-bound parse runs off the event loop under eventlet; queries stay on this thread
+            parsed, error = run_blocking(_parse_products, csv_file)
+            if error:
+                return None, error
+            df, records, invalid, invalid_rows = parsed
             
             results = {
                 'created': 0,
@@ -62,54 +149,81 @@ class CSVService:
                 'errors': []
             }
             
-            for index, row in df.iterrows():
-                try:
-                    # Check if product exists
-                    existing_product = Product.query.filter_by(sku=row['sku']).first()
-                    
-                    if existing_product and not update_existing:
-                        results['errors'].append(f"Row {index + 1}: Product with SKU '{row['sku']}' already exists")
+            # Preload the products and categories the file refers to, one query each
+            existing_product_ids = dict(db.session.execute(
+                select(Product.sku, Product.id).where(Product.sku.in_(df['sku'].dropna().unique().tolist()))
+            ).all())
+            
+            known_category_ids = set()
+            if 'category_id' in df.columns:
+                category_ids = df['category_id'].dropna().unique().tolist()
+                known_category_ids = set(db.session.scalars(select(Category.id).where(Category.id.in_(category_ids))))
+            
+            category_ids_by_name = {}
+            if 'category_name' in df.columns:
+                category_names = df['category_name'].dropna().unique().tolist()
+                category_ids_by_name = dict(db.session.execute(
+                    select(Category.name, Category.id).where(Category.name.in_(category_names))
+                ).all())
+            
+            # New products keyed by SKU and changes to existing ones keyed by id, written in one batch each
+            new_products = {}
+            product_updates = {}
+            
+            for index, row in enumerate(records):
+                if invalid_rows[index]:
+                    results['errors'].append(_row_error(invalid, index))
+                    continue
+                
+                # Check if product exists
+                existing_product_id = existing_product_ids.get(row['sku'])
+                
+                if (existing_product_id or row['sku'] in new_products) and not update_existing:
+                    results['errors'].append(f"Row {index + 1}: Product with SKU '{row['sku']}' already exists")
+                    continue
+                
+                # Validate category
+                category_id = None
+                if row.get('category_id') is not None:
+                    category_id = row['category_id']
+                    if category_id not in known_category_ids:
+                        results['errors'].append(f"Row {index + 1}: Category ID {category_id} not found")
+                        continue
+                elif row.get('category_name') is not None:
+                    category_id = category_ids_by_name.get(row['category_name'])
+                    if category_id is None:
+                        results['errors'].append(f"Row {index + 1}: Category '{row['category_name']}' not found")
                         continue
-                    
-                    # Validate category
-                    category_id = None
-                    if pd.notna(row.get('category_id')):
-                        category_id = int(row['category_id'])
-                        if not Category.query.get(category_id):
-                            results['errors'].append(f"Row {index + 1}: Category ID {category_id} not found")
-                            continue
-                    elif pd.notna(row.get('category_name')):
-                        category = Category.query.filter_by(name=row['category_name']).first()
-                        if category:
-                            category_id = category.id
-                        else:
-                            results['errors'].append(f"Row {index + 1}: Category '{row['category_name']}' not found")
-                            continue
-                    
-                    # Prepare product data
-                    product_data = {
-                        'name': row['name'],
-                        'description': row.get('description', ''),
-                        'sku': row['sku'],
-                        'barcode': row.get('barcode') if pd.notna(row.get('barcode')) else None,
-                        'category_id': category_id,
-                        'unit_price': float(row['unit_price']) if pd.notna(row.get('unit_price')) else None,
-                        'is_active': bool(row.get('is_active', True))
-                    }
-                    
-                    if existing_product:
-                        # Update existing product
-                        for key, value in product_data.items():
-                            setattr(existing_product, key, value)
-                        results['updated'] += 1
-                    else:
-                        # Create new product
-                        product = Product(**product_data)
-                        db.session.add(product)
-                        results['created'] += 1
                 
-                except Exception as e:
-                    results['errors'].append(f"Row {index + 1}: {str(e)}")
+                # Prepare product data
+                product_data = {
+                    'name': row['name'],
+                    'description': row.get('description', ''),
+                    'sku': row['sku'],
+                    'barcode': row.get('barcode'),
+                    'category_id': category_id,
+                    'unit_price': row.get('unit_price'),
+                    'is_active': row.get('is_active', True)
+                }
+                
+                if existing_product_id:
+                    # Queue the update of the existing product
+                    product_updates[existing_product_id] = {'id': existing_product_id, **product_data}
+                    results['updated'] += 1
+                elif row['sku'] in new_products:
+                    # Later row for a product created earlier in this file
+                    new_products[row['sku']] = product_data
+                    results['updated'] += 1
+                else:
+                    # Queue new product for the batch insert
+                    new_products[row['sku']] = product_data
+                    results['created'] += 1
+            
+            if new_products:
+                db.session.execute(insert(Product), list(new_products.values()))
+            
+            if product_updates:
+                db.session.execute(update(Product), list(product_updates.values()))
             
             db.session.commit()
             return results, None
@@ -121,33 +235,28 @@ class CSVService:
     
     @staticmethod
     def export_inventory():
-        """Export inventory to CSV format"""
+        """Export inventory as a generator of CSV chunks"""
         try:
-            inventory_items = Inventory.query.all()
-            
-            data = []
-            for item in inventory_items:
-                data.append({
-                    'id': item.id,
-                    'product_id': item.product_id,
-                    'product_name': item.product.name if item.product else '',
-                    'product_sku': item.product.sku if item.product else '',
-                    'warehouse_id': item.warehouse_id,
-                    'warehouse_name': item.warehouse.name if item.warehouse else '',
-                    'quantity': item.quantity,
-                    'reorder_level': item.reorder_level,
-                    'max_stock_level': item.max_stock_level,
-                    'is_low_stock': item.quantity <= item.reorder_level,
-                    'last_updated': item.last_updated.isoformat() if item.last_updated else None
-                })
+            # Join product and warehouse names in the same query
+            result = db.session.execute(
+                select(
+                    Inventory.id, Inventory.product_id, Product.name, Product.sku,
+                    Inventory.warehouse_id, Warehouse.name, Inventory.quantity,
+                    Inventory.reorder_level, Inventory.max_stock_level, Inventory.is_low_stock,
+                    Inventory.last_updated
+                )
+                .join(Product, Inventory.product_id == Product.id)
+                .join(Warehouse, Inventory.warehouse_id == Warehouse.id)
+                .order_by(Inventory.id),
+                execution_options={'yield_per': EXPORT_BATCH_SIZE}
+            )
             
-            df = pd.DataFrame(data)
-            
-            # Convert to CSV
-            output = io.StringIO()
-            df.to_csv(output, index=False)
-            csv_content = output.getvalue()
-            output.close()
+            csv_content = _stream_csv(
+                ['id', 'product_id', 'product_name', 'product_sku', 'warehouse_id', 'warehouse_name',
+                 'quantity', 'reorder_level', 'max_stock_level', 'is_low_stock', 'last_updated'],
+                result,
+                lambda row: (*row[:10], _isoformat(row.last_updated))
+            )
             
             return csv_content, None
             
@@ -156,17 +265,14 @@ class CSVService:
             return None, str(e)
     
     @staticmethod
-    def import_inventory(csv_content, update_existing=False):
-        """Import inventory from CSV content"""
+    def import_inventory(csv_file, update_existing=False):
+        """Import inventory from an uploaded CSV file stream"""
         try:
-            # Read CSV content
-            df = pd.read_csv(io.StringIO(csv_content))
-            
-            # Validate required columns
-            required_columns = ['product_id', 'warehouse_id', 'quantity']
-            missing_columns = [col for col in required_columns if col not in df.columns]
-            if missing_columns:
-                return None, f"Missing required columns: {', '.join(missing_columns)}"
+            # The CPU-bound parse runs off the event loop under eventlet; queries stay on this thread
+            parsed, error = run_blocking(_parse_inventory, csv_file)
+            if error:
+                return None, error
+            df, records, invalid, invalid_rows = parsed
             
             results = {
                 'created': 0,
@@ -174,53 +280,61 @@ class CSVService:
                 'errors': []
             }
             
-            for index, row in df.iterrows():
-                try:
-                    # Validate product and warehouse
-                    product_id = int(row['product_id'])
-                    warehouse_id = int(row['warehouse_id'])
-                    
-                    if not Product.query.get(product_id):
-                        results['errors'].append(f"Row {index + 1}: Product ID {product_id} not found")
-                        continue
-                    
-                    if not Warehouse.query.get(warehouse_id):
-                        results['errors'].append(f"Row {index + 1}: Warehouse ID {warehouse_id} not found")
-                        continue
-                    
-                    # Check if inventory item exists
-                    existing_item = Inventory.query.filter_by(
-                        product_id=product_id,
-                        warehouse_id=warehouse_id
-                    ).first()
-                    
-                    if existing_item and not update_existing:
-                        results['errors'].append(f"Row {index + 1}: Inventory item already exists for product {product_id} in warehouse {warehouse_id}")
-                        continue
-                    
-                    # Prepare inventory data
-                    inventory_data = {
-                        'product_id': product_id,
-                        'warehouse_id': warehouse_id,
-                        'quantity': int(row['quantity']),
-                        'reorder_level': int(row.get('reorder_level', 10)),
-                        'max_stock_level': int(row.get('max_stock_level', 1000))
-                    }
-                    
-                    if existing_item:
-                        # Update existing inventory
-                        for key, value in inventory_data.items():
-                            setattr(existing_item, key, value)
-                        existing_item.last_updated = datetime.utcnow()
-                        results['updated'] += 1
-                    else:
-                        # Create new inventory item
-                        inventory_item = Inventory(**inventory_data)
-                        db.session.add(inventory_item)
-                        results['created'] += 1
+            # Preload the products, warehouses and inventory rows the file refers to, one query each
+            product_ids = df['product_id'].dropna().unique().tolist()
+            warehouse_ids = df['warehouse_id'].dropna().unique().tolist()
+            
+            known_product_ids = set(db.session.scalars(select(Product.id).where(Product.id.in_(product_ids))))
+            known_warehouse_ids = set(db.session.scalars(select(Warehouse.id).where(Warehouse.id.in_(warehouse_ids))))
+            existing_keys = set(db.session.execute(
+                select(Inventory.product_id, Inventory.warehouse_id).where(
+                    Inventory.product_id.in_(product_ids),
+                    Inventory.warehouse_id.in_(warehouse_ids)
+                )
+            ).tuples())
+            
+            # Inventory rows keyed by (product_id, warehouse_id), created or replaced by one upsert
+            items = {}
+            
+            for index, row in enumerate(records):
+                if invalid_rows[index]:
+                    results['errors'].append(_row_error(invalid, index))
+                    continue
                 
-                except Exception as e:
-                    results['errors'].append(f"Row {index + 1}: {str(e)}")
+                # Validate product and warehouse
+                product_id = row['product_id']
+                warehouse_id = row['warehouse_id']
+                
+                if product_id not in known_product_ids:
+                    results['errors'].append(f"Row {index + 1}: Product ID {product_id} not found")
+                    continue
+                
+                if warehouse_id not in known_warehouse_ids:
+                    results['errors'].append(f"Row {index + 1}: Warehouse ID {warehouse_id} not found")
+                    continue
+                
+                # Check if inventory item exists, in the database or earlier in this file
+                key = (product_id, warehouse_id)
+                exists_already = key in existing_keys or key in items
+                
+                if exists_already and not update_existing:
+                    results['errors'].append(f"Row {index + 1}: Inventory item already exists for product {product_id} in warehouse {warehouse_id}")
+                    continue
+                
+                # Prepare inventory data
+                inventory_data = {
+                    'product_id': product_id,
+                    'warehouse_id': warehouse_id,
+                    'quantity': row['quantity'],
+                    'reorder_level': row['reorder_level'] if row.get('reorder_level') is not None else 10,
+                    'max_stock_level': row['max_stock_level'] if row.get('max_stock_level') is not None else 1000
+                }
+                
+                items[key] = inventory_data
+                results['updated' if exists_already else 'created'] += 1
+            
+            if items:
+                db.session.execute(inventory_upsert(increment=False, update_levels=True), list(items.values()))
             
             db.session.commit()
             return results, None
@@ -232,32 +346,23 @@ class CSVService:
     
     @staticmethod
     def export_suppliers():
-        """Export suppliers to CSV format"""
+        """Export suppliers as a generator of CSV chunks"""
         try:
-            suppliers = Supplier.query.all()
-            
-            data = []
-            for supplier in suppliers:
-                data.append({
-                    'id': supplier.id,
-                    'name': supplier.name,
-                    'contact_person': supplier.contact_person,
-                    'email': supplier.email,
-                    'phone': supplier.phone,
-                    'address': supplier.address,
-                    'tax_id': supplier.tax_id,
-                    'payment_terms': supplier.payment_terms,
-                    'is_active': supplier.is_active,
-                    'created_at': supplier.created_at.isoformat() if supplier.created_at else None
-                })
+            result = db.session.execute(
+                select(
+                    Supplier.id, Supplier.name, Supplier.contact_person, Supplier.email,
+                    Supplier.phone, Supplier.address, Supplier.tax_id, Supplier.payment_terms,
+                    Supplier.is_active, Supplier.created_at
+                ).order_by(Supplier.id),
+                execution_options={'yield_per': EXPORT_BATCH_SIZE}
+            )
             
-            df = pd.DataFrame(data)
-            
-            # Convert to CSV
-            output = io.StringIO()
-            df.to_csv(output, index=False)
-            csv_content = output.getvalue()
-            output.close()
+            csv_content = _stream_csv(
+                ['id', 'name', 'contact_person', 'email', 'phone', 'address', 'tax_id',
+                 'payment_terms', 'is_active', 'created_at'],
+                result,
+                lambda row: (*row[:9], _isoformat(row.created_at))
+            )
             
             return csv_content, None
             
@@ -270,42 +375,33 @@ class CSVService:
         """Generate CSV template for import"""
         try:
             if data_type == 'products':
-                template_data = {
-                    'name': ['Example Product 1', 'Example Product 2'],
-                    'description': ['Product description 1', 'Product description 2'],
-                    'sku': ['PROD001', 'PROD002'],
-                    'barcode': ['1234567890123', '1234567890124'],
-                    'category_id': [1, 1],
-                    'unit_price': [29.99, 39.99],
-                    'is_active': [True, True]
-                }
+                header = ['name', 'description', 'sku', 'barcode', 'category_id', 'unit_price', 'is_active']
+                rows = [
+                    ['Example Product 1', 'Product description 1', 'PROD001', '1234567890123', 1, 29.99, True],
+                    ['Example Product 2', 'Product description 2', 'PROD002', '1234567890124', 1, 39.99, True]
+                ]
             elif data_type == 'inventory':
-                template_data = {
-                    'product_id': [1, 2],
-                    'warehouse_id': [1, 1],
-                    'quantity': [100, 50],
-                    'reorder_level': [10, 15],
-                    'max_stock_level': [500, 200]
-                }
+                header = ['product_id', 'warehouse_id', 'quantity', 'reorder_level', 'max_stock_level']
+                rows = [
+                    [1, 1, 100, 10, 500],
+                    [2, 1, 50, 15, 200]
+                ]
             elif data_type == 'suppliers':
-                template_data = {
-                    'name': ['Supplier Company 1', 'Supplier Company 2'],
-                    'contact_person': ['John Doe', 'Jane Smith'],
-                    'email': ['contact@supplier1.com', 'contact@supplier2.com'],
-                    'phone': ['+1-555-0123', '+1-555-0456'],
-                    'address': ['123 Supplier St, City, State', '456 Vendor Ave, City, State'],
-                    'tax_id': ['TAX123456', 'TAX789012'],
-                    'payment_terms': ['Net 30', 'Net 45'],
-                    'is_active': [True, True]
-                }
+                header = ['name', 'contact_person', 'email', 'phone', 'address', 'tax_id', 'payment_terms', 'is_active']
+                rows = [
+                    ['Supplier Company 1', 'John Doe', 'contact@supplier1.com', '+1-555-0123',
+                     '123 Supplier St, City, State', 'TAX123456', 'Net 30', True],
+                    ['Supplier Company 2', 'Jane Smith', 'contact@supplier2.com', '+1-555-0456',
+                     '456 Vendor Ave, City, State', 'TAX789012', 'Net 45', True]
+                ]
             else:
                 return None, "Invalid data type"
             
-            df = pd.DataFrame(template_data)
-            
-            # Convert to CSV
+            # Write the rows directly; no DataFrame is needed for a fixed two-row file
             output = io.StringIO()
-            df.to_csv(output, index=False)
+            writer = csv.writer(output, lineterminator='\n')
+            writer.writerow(header)
+            writer.writerows(rows)
             csv_content = output.getvalue()
             output.close()
             
@@ -313,4 +409,4 @@ class CSVService:
             
         except Exception as e:
             current_app.logger.error(f"Template generation error: {str(e)}")
-            return None, str(e) 
\ No newline at end of file
+            return None, str(e)
\ No newline at end of file
@@ -1,91 +1,124 @@
 from flask import current_app
 from flask_mail import Message, Mail
-from models import db, NotificationLog, User, Inventory, PurchaseOrder
-from datetime import datetime
-import threading
+from jinja2 import Template
+from models import db, NotificationLog, Role, User, Inventory, PurchaseOrder
+from sqlalchemy import func, select
+from sqlalchemy.orm import joinedload, raiseload
+from concurrent.futures import ThreadPoolExecutor
+import atexit
+import os
+import time
 
-def send_async_email(app, msg, mail):
-    """Send email asynchronously"""
+# Reused worker threads for SMTP sends; caps concurrent connections during alert bursts
+_mail_executor = ThreadPoolExecutor(max_workers=int(os.environ.get('MAIL_WORKERS', 4)), thread_name_prefix='mail')
+atexit.register(_mail_executor.shutdown, wait=True)
+
+# Seconds the admin recipient list is reused before it is read again
+ADMIN_EMAILS_TTL = 30
+
+# (admin emails, monotonic expiry); per process
+_admin_emails = ([], 0.0)
+
+def get_admin_emails():
+    """Return the email addresses of active admins, reusing a recent lookup"""
+    global _admin_emails
+    
+    emails, expires_at = _admin_emails
+    now = time.monotonic()
+    if expires_at > now:
+        return emails
+    
+    # Only the email column is needed, so no User objects are built
+    emails = list(db.session.scalars(
+        select(User.email).join(User.role).where(
+            Role.name == 'Admin',
+            User.is_active == True,
+            User.email.isnot(None)
+        )
+    ))
+    
+    _admin_emails = (emails, now + ADMIN_EMAILS_TTL)
+    return emails
+
+def get_mail(app):
+    """Return the app's Flask-Mail state, registering Flask-Mail in processes that skipped it (CLI, jobs, scripts)"""
+    mail = app.extensions.get('mail')
+    if mail is None:
+        Mail(app)
+        mail = app.extensions['mail']
+    return mail
+
+def send_batch(app, mail, batch):
+    """Send (message, notification) pairs over one SMTP connection and log every outcome"""
     with app.app_context():
         try:
-            mail.send(msg)
-            return True
+            with mail.connect() as connection:
+                # Flask-Mail opens smtplib without a timeout; bound each read and write so a stalled
+                # server cannot hold a worker (and interpreter shutdown) indefinitely
+                if connection.host is not None:
+                    connection.host.sock.settimeout(app.config['MAIL_TIMEOUT'])
+                
+                for msg, notification in batch:
+                    try:
+                        connection.send(msg)
+                        notification.status = 'sent'
+                        notification.sent_at = func.now()
+                    except Exception as e:
+                        current_app.logger.error(f"Email sending failed: {str(e)}")
+                        notification.status = 'failed'
+                        notification.error_message = str(e)
         except Exception as e:
-            current_app.logger.error(f"Email sending failed: {str(e)}")
-            return False
+            # The connection itself failed; nothing still pending was sent
+            current_app.logger.error(f"Email connection failed: {str(e)}")
+            for msg, notification in batch:
+                if notification.status == 'pending':
+                    notification.status = 'failed'
+                    notification.error_message = 'Failed to send email'
+        
+        # One commit inserts the attempts together with their outcomes
+        db.session.add_all([notification for msg, notification in batch])
+        db.session.commit()
 
-def send_email(subject, recipient, html_body, text_body=None):
-    """Send email and log the attempt"""
+def send_emails(emails):
+    """Queue (subject, recipients, html_body, text_body) emails to go out over one SMTP connection"""
     try:
-        # Create notification log entry
-        notification = NotificationLog(
-            type='email',
-            title=subject,
-            message=text_body or html_body,
-            recipient_email=recipient,
-            status='pending'
-        )
-        db.session.add(notification)
-        db.session.commit()
-        
-        # Create email message
-        msg = Message(
-            subject=subject,
-            recipients=[recipient],
-            html=html_body,
-            body=text_body
-        )
-        
-        # Send email asynchronously
-        mail = current_app.extensions['mail']
+        # Message() reads the default sender from the Mail extension, so resolve it first
         app = current_app._get_current_object()
-        
-        def send_async():
-            success = send_async_email(app, msg, mail)
-            with app.app_context():
-                notification = NotificationLog.query.get(notification.id)
-                if notification:
-                    if success:
-                        notification.status = 'sent'
-                        notification.sent_at = datetime.utcnow()
-                    else:
-                        notification.status = 'failed'
-                        notification.error_message = 'Failed to send email'
-                    db.session.commit()
-        
-        thread = threading.Thread(target=send_async)
-        thread.start()
+        mail = get_mail(app)
+        
+        batch = []
+        for subject, recipients, html_body, text_body in emails:
+            # Each message goes to its recipients by BCC and is logged once, by the worker
+            msg = Message(
+                subject=subject,
+                bcc=recipients,
+                html=html_body,
+                body=text_body
+            )
+            notification = NotificationLog(
+                type='email',
+                title=subject,
+                message=text_body or html_body,
+                recipient_email=','.join(recipients),
+                status='pending'
+            )
+            batch.append((msg, notification))
+        
+        # Send on the mail pool, off the request path
+        _mail_executor.submit(send_batch, app, mail, batch)
         
         return True
         
     except Exception as e:
         current_app.logger.error(f"Email service error: {str(e)}")
-        # Update notification log
-        try:
-            notification.status = 'failed'
-            notification.error_message = str(e)
-            db.session.commit()
-        except:
-            pass
         return False
 
-def send_low_stock_alert(inventory_item):
-    """Send low stock alert email"""
-    try:
-        # Get admin users
-        admin_users = User.query.join(User.role).filter(
-            User.role.has(name='Admin'),
-            User.is_active == True,
-            User.email.isnot(None)
-        ).all()
-        
-        if not admin_users:
-            current_app.logger.warning("No admin users found for low stock alert")
-            return False
-        
-        subject = f"Low Stock Alert - {inventory_item.product.name}"
-        
-        html_body = f"""
+def send_email(subject, recipients, html_body, text_body=None):
+    """Send one email to a list of recipients (BCC) and log the attempt once"""
+    return send_emails([(subject, recipients, html_body, text_body)])
+
+# Email bodies compiled once at import; HTML templates escape the values they render
+_LOW_STOCK_HTML = Template("""
         <html>
         <body>
             <h2>Low Stock Alert</h2>
@@ -94,23 +127,23 @@ def send_low_stock_alert(inventory_item):
             <table border="1" cellpadding="10" cellspacing="0">
                 <tr>
                     <td><strong>Product:</strong></td>
-                    <td>{inventory_item.product.name}</td>
+                    <td>{{ item.product.name }}</td>
                 </tr>
                 <tr>
                     <td><strong>SKU:</strong></td>
-                    <td>{inventory_item.product.sku}</td>
+                    <td>{{ item.product.sku }}</td>
                 </tr>
                 <tr>
                     <td><strong>Warehouse:</strong></td>
-                    <td>{inventory_item.warehouse.name}</td>
+                    <td>{{ item.warehouse.name }}</td>
                 </tr>
                 <tr>
                     <td><strong>Current Stock:</strong></td>
-                    <td>{inventory_item.quantity}</td>
+                    <td>{{ item.quantity }}</td>
                 </tr>
                 <tr>
                     <td><strong>Reorder Level:</strong></td>
-                    <td>{inventory_item.reorder_level}</td>
+                    <td>{{ item.reorder_level }}</td>
                 </tr>
             </table>
             
@@ -119,90 +152,97 @@ def send_low_stock_alert(inventory_item):
             <p>Best regards,<br>Inventory Management System</p>
         </body>
         </html>
-        """
-        
-        text_body = f"""
+        """, autoescape=True)
+
+_LOW_STOCK_TEXT = Template("""
         Low Stock Alert
         
         The following item is running low on stock:
         
-        Product: {inventory_item.product.name}
-        SKU: {inventory_item.product.sku}
-        Warehouse: {inventory_item.warehouse.name}
-        Current Stock: {inventory_item.quantity}
-        Reorder Level: {inventory_item.reorder_level}
+        Product: {{ item.product.name }}
+        SKU: {{ item.product.sku }}
+        Warehouse: {{ item.warehouse.name }}
+        Current Stock: {{ item.quantity }}
+        Reorder Level: {{ item.reorder_level }}
         
         Please consider reordering this item to maintain adequate stock levels.
         
         Best regards,
         Inventory Management System
-        """
-        
-        # Send to all admin users
-        for admin in admin_users:
-            send_email(subject, admin.email, html_body, text_body)
-        
-        return True
-        
-    except Exception as e:
-        current_app.logger.error(f"Low stock alert error: {str(e)}")
-        return False
+        """)
 
-def send_purchase_order_notification(purchase_order, notification_type):
-    """Send purchase order status notification"""
-    try:
-        # Get admin users and the user who created the order (if applicable)
-        admin_users = User.query.join(User.role).filter(
-            User.role.has(name='Admin'),
-            User.is_active == True,
-            User.email.isnot(None)
-        ).all()
+_LOW_STOCK_DIGEST_HTML = Template("""
+        <html>
+        <body>
+            <h2>Low Stock Alert</h2>
+            <p>The following items are running low on stock:</p>
+            
+            <table border="1" cellpadding="10" cellspacing="0">
+                <tr>
+                    <th>Product</th>
+                    <th>SKU</th>
+                    <th>Warehouse</th>
+                    <th>Current Stock</th>
+                    <th>Reorder Level</th>
+                </tr>
+                {%- for item in items %}
+                <tr>
+                    <td>{{ item.product.name }}</td>
+                    <td>{{ item.product.sku }}</td>
+                    <td>{{ item.warehouse.name }}</td>
+                    <td>{{ item.quantity }}</td>
+                    <td>{{ item.reorder_level }}</td>
+                </tr>
+                {%- endfor %}
+            </table>
+            
+            <p>Please consider reordering these items to maintain adequate stock levels.</p>
+            
+            <p>Best regards,<br>Inventory Management System</p>
+        </body>
+        </html>
+        """, autoescape=True)
+
+_LOW_STOCK_DIGEST_TEXT = Template("""
+        Low Stock Alert
         
-        if not admin_users:
-            return False
+        The following items are running low on stock:
+        {% for item in items %}
+        - {{ item.product.name }} ({{ item.product.sku }}) at {{ item.warehouse.name }}: {{ item.quantity }} in stock, reorder level {{ item.reorder_level }}
+        {%- endfor %}
         
-        # Determine subject and content based on notification type
-        if notification_type == 'created':
-            subject = f"New Purchase Order Created - {purchase_order.order_number}"
-            action = "has been created"
-        elif notification_type == 'approved':
-            subject = f"Purchase Order Approved - {purchase_order.order_number}"
-            action = "has been approved"
-        elif notification_type == 'received':
-            subject = f"Purchase Order Received - {purchase_order.order_number}"
-            action = "has been received"
-        elif notification_type == 'cancelled':
-            subject = f"Purchase Order Cancelled - {purchase_order.order_number}"
-            action = "has been cancelled"
-        else:
-            return False
+        Please consider reordering these items to maintain adequate stock levels.
         
-        html_body = f"""
+        Best regards,
+        Inventory Management System
+        """)
+
+_PURCHASE_ORDER_HTML = Template("""
         <html>
         <body>
             <h2>Purchase Order Update</h2>
-            <p>Purchase Order {purchase_order.order_number} {action}.</p>
+            <p>Purchase Order {{ order.order_number }} {{ action }}.</p>
             
             <table border="1" cellpadding="10" cellspacing="0">
                 <tr>
                     <td><strong>Order Number:</strong></td>
-                    <td>{purchase_order.order_number}</td>
+                    <td>{{ order.order_number }}</td>
                 </tr>
                 <tr>
                     <td><strong>Supplier:</strong></td>
-                    <td>{purchase_order.supplier.name}</td>
+                    <td>{{ order.supplier.name }}</td>
                 </tr>
                 <tr>
                     <td><strong>Status:</strong></td>
-                    <td>{purchase_order.status.title()}</td>
+                    <td>{{ order.status.title() }}</td>
                 </tr>
                 <tr>
                     <td><strong>Total Amount:</strong></td>
-                    <td>${purchase_order.total_amount:.2f}</td>
+                    <td>${{ '%.2f' % order.total_amount }}</td>
                 </tr>
                 <tr>
                     <td><strong>Order Date:</strong></td>
-                    <td>{purchase_order.order_date.strftime('%Y-%m-%d')}</td>
+                    <td>{{ order.order_date.strftime('%Y-%m-%d') }}</td>
                 </tr>
             </table>
             
@@ -211,28 +251,105 @@ def send_purchase_order_notification(purchase_order, notification_type):
             <p>Best regards,<br>Inventory Management System</p>
         </body>
         </html>
-        """
-        
-        text_body = f"""
+        """, autoescape=True)
+
+_PURCHASE_ORDER_TEXT = Template("""
         Purchase Order Update
         
-        Purchase Order {purchase_order.order_number} {action}.
+        Purchase Order {{ order.order_number }} {{ action }}.
         
-        Order Number: {purchase_order.order_number}
-        Supplier: {purchase_order.supplier.name}
-        Status: {purchase_order.status.title()}
-        Total Amount: ${purchase_order.total_amount:.2f}
-        Order Date: {purchase_order.order_date.strftime('%Y-%m-%d')}
+        Order Number: {{ order.order_number }}
+        Supplier: {{ order.supplier.name }}
+        Status: {{ order.status.title() }}
+        Total Amount: ${{ '%.2f' % order.total_amount }}
+        Order Date: {{ order.order_date.strftime('%Y-%m-%d') }}
         
         Please check the system for more details.
         
         Best regards,
         Inventory Management System
-        """
+        """)
+
+def send_low_stock_alert(inventory_item, admin_emails=None):
+    """Send low stock alert email"""
+    try:
+        # Get admin recipients unless the caller already resolved them
+        if admin_emails is None:
+            admin_emails = get_admin_emails()
         
-        # Send to admin users
-        for admin in admin_users:
-            send_email(subject, admin.email, html_body, text_body)
+        if not admin_emails:
+            current_app.logger.warning("No admin users found for low stock alert")
+            return False
+        
+        subject = f"Low Stock Alert - {inventory_item.product.name}"
+        html_body = _LOW_STOCK_HTML.render(item=inventory_item)
+        text_body = _LOW_STOCK_TEXT.render(item=inventory_item)
+        
+        # One message to all admins
+        send_email(subject, admin_emails, html_body, text_body)
+        
+        return True
+        
+    except Exception as e:
+        current_app.logger.error(f"Low stock alert error: {str(e)}")
+        return False
+
+def send_low_stock_digest(inventory_items, admin_emails=None):
+    """Send one low stock email listing every item"""
+    try:
+        if not inventory_items:
+            return False
+        
+        # Get admin recipients unless the caller already resolved them
+        if admin_emails is None:
+            admin_emails = get_admin_emails()
+        
+        if not admin_emails:
+            current_app.logger.warning("No admin users found for low stock digest")
+            return False
+        
+        subject = f"Low Stock Alert - {len(inventory_items)} item(s)"
+        html_body = _LOW_STOCK_DIGEST_HTML.render(items=inventory_items)
+        text_body = _LOW_STOCK_DIGEST_TEXT.render(items=inventory_items)
+        
+        # One message to all admins
+        return send_email(subject, admin_emails, html_body, text_body)
+        
+    except Exception as e:
+        current_app.logger.error(f"Low stock digest error: {str(e)}")
+        return False
+
+def send_purchase_order_notification(purchase_order, notification_type, admin_emails=None):
+    """Send purchase order status notification (load the order with joinedload(PurchaseOrder.supplier))"""
+    try:
+        # Get admin recipients unless the caller already resolved them
+        if admin_emails is None:
+            admin_emails = get_admin_emails()
+        
+        if not admin_emails:
+            return False
+        
+        # Determine subject and content based on notification type
+        if notification_type == 'created':
+            subject = f"New Purchase Order Created - {purchase_order.order_number}"
+            action = "has been created"
+        elif notification_type == 'approved':
+            subject = f"Purchase Order Approved - {purchase_order.order_number}"
+            action = "has been approved"
+        elif notification_type == 'received':
+            subject = f"Purchase Order Received - {purchase_order.order_number}"
+            action = "has been received"
+        elif notification_type == 'cancelled':
+            subject = f"Purchase Order Cancelled - {purchase_order.order_number}"
+            action = "has been cancelled"
+        else:
+            return False
+        
+        html_body = _PURCHASE_ORDER_HTML.render(order=purchase_order, action=action)
+        text_body = _PURCHASE_ORDER_TEXT.render(order=purchase_order, action=action)
+        
+        # One message to all admins
+        send_email(subject, admin_emails, html_body, text_body)
         
         return True
         
@@ -243,14 +360,17 @@ def send_purchase_order_notification(purchase_order, notification_type):
 def check_and_send_low_stock_alerts():
     """Check for low stock items and send alerts"""
     try:
-        # Get all low stock items
-        low_stock_items = Inventory.query.filter(
-            Inventory.quantity <= Inventory.reorder_level
-        ).all()
-        
-        # Send alerts for each low stock item
-        for item in low_stock_items:
-            send_low_stock_alert(item)
+        # Get all low stock items, with the product and warehouse the digest reads in the same SELECT;
+        # any other lazy load raises instead of quietly adding a query per item
+        low_stock_items = Inventory.query.options(
+            joinedload(Inventory.product),
+            joinedload(Inventory.warehouse),
+            raiseload('*', sql_only=True)
+        ).filter_by(is_low_stock=True).all()
+        
+        # One digest for the whole run instead of an email per item
+        if low_stock_items and not send_low_stock_digest(low_stock_items):
+            return 0
         
         current_app.logger.info(f"Processed {len(low_stock_items)} low stock alerts")
         return len(low_stock_items)
@@ -285,7 +405,7 @@ def send_test_email(recipient):
         Inventory Management System
         """
         
-        return send_email(subject, recipient, html_body, text_body)
+        return send_email(subject, [recipient], html_body, text_body)
         
     except Exception as e:
         current_app.logger.error(f"Test email error: {str(e)}")
@@ -0,0 +1,115 @@
+from flask import current_app
+from services.cache import get_redis, cache_get, cache_set, invalidate_tags
+from services.csv_service import CSVService
+from models import db
+import glob
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+# Seconds a finished job's status stays available
+JOB_TTL = 86400
+
+# Seconds a queued or running status stays available; a job killed mid-run (e.g. a hard worker
+# recycle) stops reporting 'running' after this, and its spooled upload is swept after it too
+JOB_RUNNING_TTL = 3600
+
+SPOOL_PREFIX = 'csv-import-'
+
+IMPORTERS = {
+    'products': CSVService.import_products,
+    'inventory': CSVService.import_inventory
+}
+
+# Fallback job store when Redis is not configured: job id -> (job, monotonic expiry)
+_jobs = {}
+_lock = threading.Lock()
+
+def job_cache_key(job_id):
+    return f"import:{job_id}"
+
+def _save_job(job_id, job, ttl=JOB_TTL):
+    if get_redis() is None:
+        now = time.monotonic()
+        with _lock:
+            # Drop expired entries so the fallback store stays bounded
+            for expired_id in [key for key, (_, expires_at) in _jobs.items() if expires_at <= now]:
+                del _jobs[expired_id]
+            _jobs[job_id] = (job, now + ttl)
+    else:
+        cache_set(job_cache_key(job_id), job, ttl)
+
+def get_import_job(job_id):
+    """Return the status record for an import job, or None if it is unknown"""
+    if get_redis() is None:
+        with _lock:
+            entry = _jobs.get(job_id)
+        if entry is None or entry[1] <= time.monotonic():
+            return None
+        return entry[0]
+    return cache_get(job_cache_key(job_id))
+
+def _sweep_spool_files():
+    """Remove uploads left behind by jobs that were killed before their cleanup ran"""
+    cutoff = time.time() - JOB_RUNNING_TTL
+    for path in glob.glob(os.path.join(tempfile.gettempdir(), f'{SPOOL_PREFIX}*.csv')):
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
+
+def start_import(data_type, upload, update_existing=False):
+    """Spool an uploaded CSV to disk and import it, returning (job id, current job record)"""
+    _sweep_spool_files()
+    
+    fd, path = tempfile.mkstemp(prefix=SPOOL_PREFIX, suffix='.csv')
+    with os.fdopen(fd, 'wb') as f:
+        upload.save(f)
+    
+    job_id = uuid.uuid4().hex
+    app = current_app._get_current_object()
+    
+    # Without Redis a job's status is only visible to this process, so other workers would
+    # answer 404 for it; import inline and hand the finished record back instead
+    if get_redis() is None:
+        return job_id, _run_import(app, job_id, data_type, path, update_existing)
+    
+    job = {'status': 'queued', 'data_type': data_type}
+    _save_job(job_id, job, JOB_RUNNING_TTL)
+    
+    # A green thread under eventlet, so the job shares the worker's patched pool and Redis client
+    # safely (the importers push their pandas parse to a native thread); not a daemon, so a
+    # graceful shutdown lets the job record its outcome
+    thread = threading.Thread(
+        target=_run_import,
+        args=(app, job_id, data_type, path, update_existing),
+        name=f'import-{job_id}'
+    )
+    thread.start()
+    
+    return job_id, job
+
+def _run_import(app, job_id, data_type, path, update_existing):
+    with app.app_context():
+        try:
+            _save_job(job_id, {'status': 'running', 'data_type': data_type}, JOB_RUNNING_TTL)
+            results, error = IMPORTERS[data_type](path, update_existing)
+            
+            if error:
+                job = {'status': 'failed', 'data_type': data_type, 'error': error}
+            else:
+                # Product rows feed the inventory listings too
+                invalidate_tags('products', 'inventory')
+                job = {'status': 'completed', 'data_type': data_type, 'results': results}
+        except Exception as e:
+            app.logger.error(f"Import job {job_id} failed: {str(e)}")
+            job = {'status': 'failed', 'data_type': data_type, 'error': str(e)}
+        finally:
+            db.session.remove()
+            os.remove(path)
+        
+        _save_job(job_id, job)
+        return job
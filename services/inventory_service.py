@@ -0,0 +1,34 @@
+from sqlalchemy import func
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from models import db, Inventory
+
+# Dialect-specific INSERT constructs that support upserts
+_UPSERT_INSERTS = {
+    'mysql': mysql.insert,
+    'postgresql': postgresql.insert,
+    'sqlite': sqlite.insert
+}
+
+def inventory_upsert(increment=True, update_levels=False):
+    """Build an INSERT into inventory that updates the existing product/warehouse row instead of failing.
+    
+    With increment the inserted quantity is added to the stored quantity, otherwise it
+    replaces it; update_levels also overwrites the reorder and max stock levels.
+    Execute with one parameter dict per row.
+    """
+    dialect = db.session.get_bind().dialect.name
+    stmt = _UPSERT_INSERTS[dialect](Inventory)
+    inserted = stmt.inserted if dialect == 'mysql' else stmt.excluded
+    
+    updates = {
+        'quantity': Inventory.quantity + inserted.quantity if increment else inserted.quantity,
+        'last_updated': func.now()  # ORM onupdate defaults don't apply to the upsert branch
+    }
+    
+    if update_levels:
+        updates['reorder_level'] = inserted.reorder_level
+        updates['max_stock_level'] = inserted.max_stock_level
+    
+    if dialect == 'mysql':
+        return stmt.on_duplicate_key_update(**updates)
+    return stmt.on_conflict_do_update(index_elements=['product_id', 'warehouse_id'], set_=updates)
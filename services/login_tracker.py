@@ -0,0 +1,60 @@
+from flask import current_app
+from sqlalchemy import bindparam
+from models import db, User
+import atexit
+import threading
+import time
+
+# Seconds between batched last_login writes
+FLUSH_INTERVAL = 10
+
+_pending = {}
+_lock = threading.Lock()
+_flusher = None
+
+def record_login(user_id, timestamp):
+    """Queue a last_login update instead of committing it on the request path"""
+    global _flusher
+
+    with _lock:
+        _pending[user_id] = timestamp
+
+        if _flusher is None:
+            app = current_app._get_current_object()
+            _flusher = threading.Thread(target=_flush_periodically, args=(app,), daemon=True)
+            _flusher.start()
+            atexit.register(flush_last_logins, app)
+
+def flush_last_logins(app):
+    """Write all queued last_login values in one batched UPDATE"""
+    global _pending
+
+    with _lock:
+        rows, _pending = _pending, {}
+
+    if not rows:
+        return 0
+
+    with app.app_context():
+        try:
+            users = User.__table__
+            db.session.execute(
+                users.update()
+                .where(users.c.id == bindparam('user_id'))
+                .values(last_login=bindparam('login_at')),
+                [{'user_id': user_id, 'login_at': login_at} for user_id, login_at in rows.items()]
+            )
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f"last_login flush failed: {str(e)}")
+            return 0
+        finally:
+            db.session.remove()
+
+    return len(rows)
+
+def _flush_periodically(app):
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        flush_last_logins(app)
@@ -0,0 +1,16 @@
+from flask import g, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g._query_count = g.get('_query_count', 0) + 1
+
+def init_query_counter(app):
+    """Count SQL statements per request and report them in an X-Query-Count response header"""
+    event.listen(Engine, 'before_cursor_execute', _count_query)
+    
+    @app.after_request
+    def add_query_count_header(response):
+        response.headers['X-Query-Count'] = str(g.get('_query_count', 0))
+        return response
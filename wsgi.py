@@ -0,0 +1,17 @@
+"""
+WSGI entrypoint for production servers (e.g. `gunicorn wsgi:app`).
+Initializes the runtime-only extensions that CLI scripts skip.
+"""
+
+import os
+
+# An explicit eventlet mode under a server that didn't patch the process (e.g. a sync gunicorn
+# worker) still needs cooperative sockets; patch before the app imports pymysql and redis
+if os.environ.get('SOCKETIO_ASYNC_MODE') == 'eventlet':
+    import eventlet
+    eventlet.monkey_patch()
+
+from app import app, init_runtime_extensions, warm_up
+
+socketio = init_runtime_extensions(app)
+warm_up(app)